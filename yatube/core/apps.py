@@ -3,3 +3,16 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import slow_queries, sqlite_tuning
+
+        connection_created.connect(
+            sqlite_tuning.tune_connection,
+            dispatch_uid='core.sqlite_tuning',
+        )
+        connection_created.connect(
+            slow_queries.install, dispatch_uid='core.slow_queries',
+        )
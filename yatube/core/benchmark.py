@@ -0,0 +1,225 @@
+"""Замеры представлений posts через тестовый клиент Django.
+
+Каждое представление вызывается ``requests`` раз на текущей базе,
+которую заранее заполняет команда ``seed``. Для каждого берётся самый
+тяжёлый объект: группа и автор с наибольшим числом постов, пост
+с наибольшим числом комментариев, читатель с наибольшим числом
+подписок. Пиковая память снимается отдельным проходом под tracemalloc,
+чтобы он не искажал время. Все изменения базы откатываются, а кеш
+на время замера подменяется отдельным LocMemCache, чтобы откаченные
+посты и версии лент не остались в общем кеше сайта.
+"""
+import json
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+import django
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+from . import tiered_cache
+from .instrumentation import percentile
+
+ISOLATED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+}
+
+VIEWS = (
+    'index', 'group_list', 'profile', 'post_detail', 'follow_index',
+    'create',
+)
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def build_targets():
+    """{имя: (метод, url, данные, пользователь)} для тяжёлых объектов."""
+    group = Group.objects.annotate(
+        total=Count('posts')).order_by('-total').first()
+    stats = AuthorStats.objects.select_related(
+        'author').order_by('-posts_count').first()
+    post = Post.objects.annotate(
+        total=Count('comments')).order_by('-total').first()
+    reader = Follow.objects.values('user').annotate(
+        total=Count('id')).order_by('-total').first()
+    if None in (group, stats, post, reader):
+        raise BenchmarkError(
+            'В базе нет данных, сначала выполните manage.py seed'
+        )
+    author = stats.author
+    return {
+        'index': ('get', reverse('posts:index'), None, None),
+        'group_list': (
+            'get', reverse('posts:group_list', args=(group.slug,)),
+            None, None,
+        ),
+        'profile': (
+            'get', reverse('posts:profile', args=(author.username,)),
+            None, None,
+        ),
+        'post_detail': (
+            'get', reverse('posts:post_detail', args=(post.pk,)),
+            None, None,
+        ),
+        'follow_index': (
+            'get', reverse('posts:follow_index'), None,
+            User.objects.get(pk=reader['user']),
+        ),
+        'create': (
+            'post', reverse('posts:create'),
+            {'text': 'Пост из замера', 'group': group.pk}, author,
+        ),
+    }
+
+
+def _request(client, method, url, data):
+    """Один запрос: (время в мс, число SQL-запросов)."""
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(count))
+        start = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        elapsed = time.perf_counter() - start
+    if response.status_code not in (200, 302):
+        raise BenchmarkError(f'{method.upper()} {url}: {response.status_code}')
+    return elapsed * 1000, queries
+
+
+def _peak_memory(client, method, url, data, repeat):
+    """Наибольший прирост памяти за один запрос, КБ."""
+    peak = 0
+    for _ in range(repeat):
+        # Перезапуск обнуляет пик; tracemalloc.reset_peak есть только
+        # с Python 3.9.
+        tracemalloc.start()
+        try:
+            getattr(client, method)(url, data)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_view(target, requests, warmup, memory_requests, cold=False):
+    method, url, data, user = target
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    for _ in range(warmup):
+        _request(client, method, url, data)
+    latencies, queries = [], []
+    for _ in range(requests):
+        if cold:
+            cache.clear()
+        elapsed, count = _request(client, method, url, data)
+        latencies.append(elapsed)
+        queries.append(count)
+    return {
+        'url': url,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3),
+        },
+        'queries': {
+            'p50': percentile(queries, 50),
+            'max': max(queries),
+        },
+        'peak_kb': _peak_memory(client, method, url, data, memory_requests),
+    }
+
+
+def run(views=VIEWS, requests=50, warmup=5, memory_requests=5,
+        cold=False):
+    """Замеры представлений views. База после замера не меняется."""
+    results = {}
+    tiered_cache.clear_local()
+    try:
+        with override_settings(CACHES=ISOLATED_CACHES):
+            with transaction.atomic():
+                targets = build_targets()
+                for name in views:
+                    results[name] = bench_view(
+                        targets[name], requests, warmup, memory_requests,
+                        cold,
+                    )
+                transaction.set_rollback(True)
+            cache.clear()
+    finally:
+        tiered_cache.clear_local()
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': requests,
+            'cold': cold,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        },
+        'views': results,
+    }
+
+
+def save(results, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline, current, threshold=0.2, min_ms=1.0, min_kb=16):
+    """Регрессии current относительно baseline: список
+    (представление, метрика, было, стало).
+
+    Время и память считаются регрессией, если выросли больше чем
+    на threshold и больше шумового порога min_ms / min_kb. Число
+    запросов должно быть не больше, чем в baseline.
+    """
+    regressions = []
+    for view, new in current['views'].items():
+        old = baseline['views'].get(view)
+        if old is None:
+            continue
+        for metric in ('p50', 'p95'):
+            was, now = old['latency_ms'][metric], new['latency_ms'][metric]
+            if now > was * (1 + threshold) and now - was > min_ms:
+                regressions.append((view, f'latency {metric}', was, now))
+        was, now = old['queries']['max'], new['queries']['max']
+        if now > was:
+            regressions.append((view, 'queries', was, now))
+        was, now = old['peak_kb'], new['peak_kb']
+        if now > was * (1 + threshold) and now - was > min_kb:
+            regressions.append((view, 'peak_kb', was, now))
+    return regressions
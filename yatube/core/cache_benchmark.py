@@ -0,0 +1,98 @@
+"""Сравнение SQLiteCache с LocMemCache.
+
+Для каждого бэкенда замеряется время операции в микросекундах
+на типичных для сайта значениях: фрагменте HTML страницы ленты
+и счётчике версии. Отдельно проверяется, видят ли воркеры записи
+друг друга: каждый процесс пишет свой ключ и читает ключи остальных.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from .sqlite_cache import SQLiteCache
+
+FRAGMENT = '<article><p>' + 'Текст поста. ' * 200 + '</p></article>'
+BATCH = 20
+
+
+def make_backends(location=None):
+    location = location or os.path.join(
+        tempfile.mkdtemp(), 'cache.sqlite3'
+    )
+    return {
+        'locmem': lambda: LocMemCache('benchmark', {
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }),
+        'sqlite': lambda: SQLiteCache(location, {
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }),
+    }
+
+
+def _timed(operations, func):
+    start = time.perf_counter()
+    for i in range(operations):
+        func(i)
+    return round((time.perf_counter() - start) / operations * 1e6, 1)
+
+
+def bench(cache, operations=2000):
+    """{операция: мкс на вызов}."""
+    keys = [f'fragment:{i}' for i in range(operations)]
+    batches = [keys[i:i + BATCH] for i in range(0, operations, BATCH)]
+    cache.set('version', 1)
+    results = {
+        'set': _timed(
+            operations, lambda i: cache.set(keys[i], FRAGMENT)
+        ),
+        'get': _timed(operations, lambda i: cache.get(keys[i])),
+        'get miss': _timed(operations, lambda i: cache.get(f'miss:{i}')),
+        'incr': _timed(operations, lambda i: cache.incr('version')),
+        f'get_many {BATCH}': _timed(
+            len(batches), lambda i: cache.get_many(batches[i])
+        ),
+        f'set_many {BATCH}': _timed(
+            len(batches),
+            lambda i: cache.set_many(dict.fromkeys(batches[i], FRAGMENT)),
+        ),
+    }
+    cache.clear()
+    return results
+
+
+def _worker(factory, worker, workers, barrier, hits):
+    cache = factory()
+    cache.set(f'worker:{worker}', worker)
+    barrier.wait()
+    others = [f'worker:{i}' for i in range(workers) if i != worker]
+    hits.put(len(cache.get_many(others)))
+
+
+def shared_hits(factory, workers=4):
+    """Доля ключей других процессов, которые видит каждый процесс."""
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    hits = context.Queue()
+    processes = [
+        context.Process(
+            target=_worker, args=(factory, i, workers, barrier, hits),
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    found = sum(hits.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return found / (workers * (workers - 1))
+
+
+def run(operations=2000, workers=4, location=None):
+    results = {}
+    for name, factory in make_backends(location).items():
+        results[name] = bench(factory(), operations)
+        results[name]['shared'] = shared_hits(factory, workers)
+    return results
@@ -0,0 +1,114 @@
+"""Чтение с реплик базы с «чтением своих записей».
+
+Реплики перечислены в ``DATABASE_REPLICAS`` как {алиас: вес}. Реплика
+выбирается случайно пропорционально весу один раз на запрос (вне
+запросов — на поток), и все чтения запроса идут на неё: страница не
+смешивает данные реплик с разным отставанием. Запись всегда идёт на
+``default``. Если реплик нет, всё читается с ``default``.
+
+После записи поток читает только с ``default``, пока не закончится
+запрос. ``ReplicaPinMiddleware`` ставит после записи cookie на
+``REPLICA_STICKY_SECONDS`` секунд, и следующие запросы того же
+пользователя тоже читают с ``default``, пока реплика догоняет. Внутри
+транзакции на ``default`` чтение тоже идёт с неё.
+
+Фоновые задачи, запущенные сразу после записи (прогрев страниц,
+миниатюры, дополнение лент), идут без middleware, поэтому читают внутри
+``primary()``: иначе они отрисовали бы данные отстающей реплики.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def pin_primary():
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+    _state.replica = None
+
+
+@contextmanager
+def primary():
+    """Внутри блока поток читает только с default."""
+    pinned = is_pinned()
+    pin_primary()
+    try:
+        yield
+    finally:
+        _state.pinned = pinned
+
+
+def choose_replica(replicas):
+    aliases = list(replicas)
+    return random.choices(aliases, weights=list(replicas.values()))[0]
+
+
+def current_replica(replicas):
+    """Реплика текущего запроса, выбранная при первом чтении."""
+    replica = getattr(_state, 'replica', None)
+    if replica not in replicas:
+        replica = _state.replica = choose_replica(replicas)
+    return replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return current_replica(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них связаны между собой.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            pin_primary()
+        try:
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+        finally:
+            reset()
+        return response
@@ -0,0 +1,199 @@
+"""Замеры представлений: число SQL-запросов, время SQL, время отрисовки
+шаблонов и полное время ответа.
+
+Замеры отдаются в заголовке ``Server-Timing`` и копятся в скользящем
+окне последних ``INSTRUMENTATION_WINDOW`` запросов каждого
+представления. Каждые ``INSTRUMENTATION_FLUSH_EVERY`` запросов окно
+процесса сохраняется в ``INSTRUMENTATION_DUMP_DIR``, откуда его читает
+команда ``timings``. Каталог создаётся доступным только владельцу, а
+каталог или файлы другого пользователя не читаются. При
+``INSTRUMENTATION_ENABLED = False`` middleware не подключается вовсе.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+METRICS = ('queries', 'sql_ms', 'template_ms', 'total_ms')
+
+_local = threading.local()
+_original_render = None
+
+
+class Histogram:
+    """Последние замеры каждого представления."""
+
+    def __init__(self):
+        self._samples = defaultdict(
+            lambda: deque(maxlen=settings.INSTRUMENTATION_WINDOW)
+        )
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def add(self, view, sample):
+        with self._lock:
+            self._samples[view].append(sample)
+            self.recorded += 1
+            return self.recorded
+
+    def samples(self):
+        with self._lock:
+            return {view: list(rows) for view, rows in self._samples.items()}
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self.recorded = 0
+
+
+histogram = Histogram()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(samples):
+    """{view: {metric: {count, p50, p95, p99, max}}} по спискам замеров."""
+    summary = {}
+    for view, rows in samples.items():
+        if not rows:
+            continue
+        summary[view] = {}
+        for i, metric in enumerate(METRICS):
+            values = [row[i] for row in rows]
+            summary[view][metric] = {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'max': max(values),
+            }
+    return summary
+
+
+def _check_owner(path):
+    if os.stat(path).st_uid != os.getuid():
+        raise ImproperlyConfigured(
+            f'Каталог замеров {path} принадлежит другому пользователю'
+        )
+
+
+def dump(directory):
+    """Сохраняет окно замеров процесса в <directory>/<pid>.json."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_owner(directory)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, 'w') as file:
+        json.dump(histogram.samples(), file)
+    os.replace(tmp_path, path)
+
+
+def load(directory):
+    """Замеры всех процессов из directory, слитые по представлениям.
+    Чужие и испорченные файлы пропускаются.
+    """
+    merged = defaultdict(list)
+    if not os.path.isdir(directory):
+        return merged
+    _check_owner(directory)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.endswith('.json') or not os.path.isfile(path):
+            continue
+        if os.stat(path).st_uid != os.getuid():
+            continue
+        try:
+            with open(path) as file:
+                samples = json.load(file)
+        except ValueError:
+            continue
+        for view, rows in samples.items():
+            merged[view].extend(rows)
+    return merged
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = getattr(_local, 'metrics', None)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics['queries'] += 1
+            metrics['sql'] += time.perf_counter() - start
+
+
+def _timed_render(self, context):
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        return _original_render(self, context)
+    # {% extends %} и {% include %} вызывают _render вложенно,
+    # время считаем только у внешнего шаблона.
+    metrics['depth'] += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        metrics['depth'] -= 1
+        if not metrics['depth']:
+            metrics['template'] += time.perf_counter() - start
+
+
+def _patch_template_render():
+    global _original_render
+    if _original_render is None:
+        _original_render = Template._render
+        Template._render = _timed_render
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _patch_template_render()
+
+    def __call__(self, request):
+        metrics = {'queries': 0, 'sql': 0.0, 'template': 0.0, 'depth': 0}
+        _local.metrics = metrics
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_time_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - start
+
+        sample = (
+            metrics['queries'],
+            round(metrics['sql'] * 1000, 3),
+            round(metrics['template'] * 1000, 3),
+            round(total * 1000, 3),
+        )
+        response['Server-Timing'] = (
+            f'db;dur={sample[1]};desc="{sample[0]} queries", '
+            f'tpl;dur={sample[2]}, total;dur={sample[3]}'
+        )
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        recorded = histogram.add(view, sample)
+        if recorded % settings.INSTRUMENTATION_FLUSH_EVERY == 0:
+            dump(settings.INSTRUMENTATION_DUMP_DIR)
+        return response
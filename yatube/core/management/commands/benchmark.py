@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замеры представлений posts на текущей базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--memory-requests', type=int, default=5,
+            help='Сколько запросов выполнить под tracemalloc',
+        )
+        parser.add_argument(
+            '--views', nargs='+', choices=benchmark.VIEWS,
+            default=benchmark.VIEWS,
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument('--output', default=settings.BENCHMARK_RESULTS)
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результат и как эталон для benchmark_compare',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmark.run(
+                views=options['views'],
+                requests=options['requests'],
+                warmup=options['warmup'],
+                memory_requests=options['memory_requests'],
+                cold=options['cold'],
+            )
+        except benchmark.BenchmarkError as error:
+            raise CommandError(error)
+        benchmark.save(results, options['output'])
+        if options['save_baseline']:
+            benchmark.save(results, settings.BENCHMARK_BASELINE)
+
+        self.stdout.write(
+            f'{"view":<14}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"queries":>9}{"peak KB":>10}'
+        )
+        for view, row in results['views'].items():
+            latency = row['latency_ms']
+            self.stdout.write(
+                f'{view:<14}{latency["p50"]:>9.1f}{latency["p95"]:>9.1f}'
+                f'{latency["p99"]:>9.1f}{row["queries"]["max"]:>9}'
+                f'{row["peak_kb"]:>10.1f}'
+            )
+        self.stdout.write(f'Результаты сохранены в {options["output"]}')
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает результаты benchmark с эталоном'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'current', nargs='?', default=settings.BENCHMARK_RESULTS,
+        )
+        parser.add_argument(
+            '--baseline', default=settings.BENCHMARK_BASELINE,
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый относительный рост времени и памяти',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            baseline = benchmark.load(options['baseline'])
+            current = benchmark.load(options['current'])
+        except OSError as error:
+            raise CommandError(error)
+        regressions = benchmark.compare(
+            baseline, current, threshold=options['threshold'],
+        )
+        if not regressions:
+            self.stdout.write('Регрессий нет')
+            return
+        for view, metric, was, now in regressions:
+            self.stdout.write(f'{view:<14}{metric:<14}{was:>10} -> {now}')
+        raise CommandError(f'Найдено регрессий: {len(regressions)}')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core import cache_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает SQLiteCache с LocMemCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько процессов проверяют общий доступ к записям',
+        )
+        parser.add_argument(
+            '--location', help='Файл SQLite, по умолчанию временный',
+        )
+
+    def handle(self, *args, **options):
+        results = cache_benchmark.run(
+            operations=options['operations'],
+            workers=options['workers'],
+            location=options['location'],
+        )
+        names = list(results)
+        self.stdout.write(
+            f'{"мкс на операцию":<18}'
+            + ''.join(f'{name:>10}' for name in names)
+        )
+        for operation in results[names[0]]:
+            if operation == 'shared':
+                continue
+            self.stdout.write(f'{operation:<18}' + ''.join(
+                f'{results[name][operation]:>10.1f}' for name in names
+            ))
+        self.stdout.write(f'{"общие записи, %":<18}' + ''.join(
+            f'{results[name]["shared"] * 100:>10.0f}' for name in names
+        ))
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import load, summarize
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов по отпечаткам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=settings.SLOW_QUERY_LOG_FILE,
+            help='Журнал, ротированные копии читаются вместе с ним',
+        )
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        summary = summarize(load(options['file']))[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        if not summary:
+            self.stdout.write('Медленных запросов нет')
+            return
+        for item in summary:
+            self.stdout.write(
+                f'{item["fingerprint"]}  n={item["count"]}  '
+                f'total={item["total_ms"]:.1f}  p50={item["p50_ms"]:.1f}  '
+                f'p95={item["p95_ms"]:.1f}  max={item["max_ms"]:.1f} мс'
+            )
+            self.stdout.write(f'  {item["sql"]}')
+            if item['views']:
+                self.stdout.write(f'  views: {", ".join(item["views"])}')
+            if item['frame']:
+                self.stdout.write(f'  at {item["frame"]}')
+            for step in item['plan'] or ():
+                self.stdout.write(f'    {step}')
+            self.stdout.write('')
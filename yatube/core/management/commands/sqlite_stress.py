@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core import sqlite_stress
+
+ROWS = (
+    ('ошибки locked', 'locked'),
+    ('записей', 'writes'),
+    ('записей в секунду', 'writes_per_s'),
+    ('чтений ленты', 'reads'),
+    ('чтение p95, мс', 'read_p95_ms'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Одновременные записи и чтения SQLite без ожидания, с настройками '
+        'по умолчанию и с SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument(
+            '--writes', type=int, default=200,
+            help='Сколько запросов делает каждый писатель',
+        )
+
+    def handle(self, *args, **options):
+        results = sqlite_stress.run(
+            writers=options['writers'],
+            readers=options['readers'],
+            writes=options['writes'],
+        )
+        names = list(results)
+        self.stdout.write(
+            f'{"":<20}' + ''.join(f'{name:>10}' for name in names)
+        )
+        for title, field in ROWS:
+            self.stdout.write(f'{title:<20}' + ''.join(
+                f'{str(results[name][field]):>10}' for name in names
+            ))
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_sqlite(source, target):
+    """Копия базы SQLite через backup API: согласованный снимок даже
+    при идущих записях.
+    """
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+
+
+class Command(BaseCommand):
+    help = 'Копирует базу default в реплики SQLite для локальной проверки'
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы (YATUBE_DB_REPLICAS)')
+        source = connections[DEFAULT_DB_ALIAS].settings_dict
+        if source['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Копирование поддерживается только для SQLite')
+        for alias in settings.DATABASE_REPLICAS:
+            target = connections[alias].settings_dict['NAME']
+            copy_sqlite(source['NAME'], target)
+            self.stdout.write(f'{alias}: {target}')
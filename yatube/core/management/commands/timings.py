@@ -0,0 +1,38 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.instrumentation import load, summarize
+
+
+class Command(BaseCommand):
+    help = 'Сводка замеров представлений всех процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=settings.INSTRUMENTATION_DUMP_DIR,
+            help='Каталог с замерами процессов',
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        summary = summarize(load(options['dir']))
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(
+            f'{"view":<28}{"n":>7}{"queries p50":>13}'
+            f'{"sql p95":>10}{"tpl p95":>10}{"total p50":>11}'
+            f'{"p95":>9}{"p99":>9}'
+        )
+        for view, metrics in sorted(summary.items()):
+            total = metrics['total_ms']
+            self.stdout.write(
+                f'{view:<28}{total["count"]:>7}'
+                f'{metrics["queries"]["p50"]:>13}'
+                f'{metrics["sql_ms"]["p95"]:>10.1f}'
+                f'{metrics["template_ms"]["p95"]:>10.1f}'
+                f'{total["p50"]:>11.1f}{total["p95"]:>9.1f}'
+                f'{total["p99"]:>9.1f}'
+            )
@@ -0,0 +1,135 @@
+"""Кеш объектов моделей по первичному ключу и уникальным полям.
+
+Объект хранится под ключом первичного ключа, а по остальным полям
+(slug, username) хранится только первичный ключ. Сохранение и удаление
+объекта сбрасывают его ключ через сигналы, поэтому ссылки по старому
+slug проверяются при чтении и считаются промахом.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.http import Http404
+
+_registry = {}
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(event, n=1):
+    with _stats_lock:
+        _stats[event] += n
+
+
+def stats():
+    """Счётчики попаданий и промахов с запуска процесса."""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def make_key(model, field, value):
+    opts = model._meta
+    return f'obj:{opts.label_lower}:{field}:{value}'
+
+
+def register(model, fields=()):
+    """Включает кеширование модели: по pk и по уникальным полям fields."""
+    post_migrate.connect(clear_after_migrate, dispatch_uid='object_cache')
+    _registry[model] = tuple(fields)
+    uid = f'object_cache:{model._meta.label_lower}'
+    post_save.connect(_invalidate_handler, sender=model, dispatch_uid=uid)
+    post_delete.connect(_invalidate_handler, sender=model, dispatch_uid=uid)
+
+
+def _invalidate_handler(sender, instance, **kwargs):
+    invalidate(instance)
+
+
+def clear_after_migrate(sender, **kwargs):
+    """migrate и flush меняют таблицы в обход сигналов моделей."""
+    cache.clear()
+
+
+def invalidate(instance):
+    cache.delete(make_key(type(instance), 'pk', instance.pk))
+
+
+def put(instance):
+    """Кладёт объект в кеш (cache-aside)."""
+    model = type(instance)
+    values = {make_key(model, 'pk', instance.pk): instance}
+    for field in _registry.get(model, ()):
+        values[make_key(model, field, getattr(instance, field))] = instance.pk
+    cache.set_many(values, settings.OBJECT_CACHE_TIMEOUT)
+
+
+def _get_by_pk(model, pk):
+    key = make_key(model, 'pk', pk)
+    instance = cache.get(key)
+    if instance is not None:
+        _count('hits')
+        return instance
+    _count('misses')
+    instance = model._default_manager.get(pk=pk)
+    put(instance)
+    return instance
+
+
+def get(model, **lookup):
+    """Объект по одному полю: ``get(Post, pk=1)``,
+    ``get(Group, slug='cats')``. Если объекта нет, выбрасывает
+    ``model.DoesNotExist``, как ``QuerySet.get``.
+    """
+    (field, value), = lookup.items()
+    if field in ('pk', model._meta.pk.name):
+        return _get_by_pk(model, value)
+    if field not in _registry.get(model, ()):
+        raise ValueError(
+            f'Поле {field} модели {model.__name__} не кешируется'
+        )
+    key = make_key(model, field, value)
+    pk = cache.get(key)
+    if pk is not None:
+        instance = _get_by_pk(model, pk)
+        if getattr(instance, field) == value:
+            return instance
+        cache.delete(key)
+    else:
+        _count('misses')
+    instance = model._default_manager.get(**{field: value})
+    put(instance)
+    return instance
+
+
+def get_or_404(model, **lookup):
+    try:
+        return get(model, **lookup)
+    except model.DoesNotExist:
+        raise Http404(f'{model._meta.object_name} не найден')
+
+
+def get_many(model, pks):
+    """Словарь {pk: объект}. Недостающие объекты выбираются одним
+    запросом и кладутся в кеш.
+    """
+    keys = {make_key(model, 'pk', pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    result = {keys[key]: instance for key, instance in found.items()}
+    _count('hits', len(result))
+    missing = [pk for pk in keys.values() if pk not in result]
+    if missing:
+        _count('misses', len(missing))
+        fetched = model._default_manager.in_bulk(missing)
+        cache.set_many(
+            {make_key(model, 'pk', pk): obj for pk, obj in fetched.items()},
+            settings.OBJECT_CACHE_TIMEOUT,
+        )
+        result.update(fetched)
+    return result
@@ -0,0 +1,247 @@
+"""Журнал медленных SQL-запросов.
+
+Обёртка курсора ставится на каждое новое соединение
+(``connection_created``). Запрос дольше ``SLOW_QUERY_THRESHOLD_MS``
+записывается с текстом, параметрами, временем, представлением и
+строкой из ``SLOW_QUERY_MODULES``, откуда он выполнен, а для SELECT
+ещё и с планом (``EXPLAIN QUERY PLAN`` в SQLite, ``EXPLAIN`` в
+остальных базах). План запрашивается отдельным курсором, в обход
+обёрток.
+
+Параметры пишутся только для SELECT, не затрагивающих таблицы из
+``SLOW_QUERY_SENSITIVE_TABLES``: в параметрах записи и чтения сессий
+и пользователей лежат хеши паролей и ключи сессий.
+
+Записи по одной строке JSON уходят в логгер ``yatube.slow_queries``
+(в настройках это файл с ротацией ``SLOW_QUERY_LOG_FILE``, доступный
+только владельцу) и в кольцевой буфер последних ``SLOW_QUERY_BUFFER``
+записей процесса. Ошибка при записи в журнал не мешает самому запросу.
+Команда ``slow_queries`` сводит записи по отпечатку запроса: SQL, где
+литералы и списки ``IN`` заменены на ``?``.
+"""
+import hashlib
+import json
+import linecache
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .instrumentation import percentile
+
+logger = logging.getLogger('yatube.slow_queries')
+errors = logging.getLogger(__name__)
+
+MAX_PARAM_LENGTH = 200
+
+_buffer = deque(maxlen=settings.SLOW_QUERY_BUFFER)
+_lock = threading.Lock()
+
+_NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize(sql):
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def recent():
+    """Записи кольцевого буфера процесса, от старых к новым."""
+    with _lock:
+        return list(_buffer)
+
+
+def clear():
+    with _lock:
+        _buffer.clear()
+
+
+def _short(value):
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = str(value)
+    if len(text) > MAX_PARAM_LENGTH:
+        text = text[:MAX_PARAM_LENGTH] + '…'
+    return text
+
+
+def is_sensitive(sql):
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return True
+    return any(
+        table in sql for table in settings.SLOW_QUERY_SENSITIVE_TABLES
+    )
+
+
+def _params(params, many):
+    if params is None:
+        return None
+    if many:
+        # Для executemany хватит первого набора и числа наборов.
+        params = list(params)
+        first = params[0] if params else []
+        return {
+            'first': [_short(value) for value in first],
+            'count': len(params),
+        }
+    if isinstance(params, dict):
+        return {key: _short(value) for key, value in params.items()}
+    return [_short(value) for value in params]
+
+
+def _caller():
+    """Представление и строка, из которых выполнен запрос: самый внешний
+    и самый внутренний кадры стека из SLOW_QUERY_MODULES.
+    """
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get('__name__') in settings.SLOW_QUERY_MODULES:
+            frames.append(frame)
+        frame = frame.f_back
+    if not frames:
+        return None, None
+    outer, inner = frames[-1], frames[0]
+    view = f'{outer.f_globals["__name__"]}.{outer.f_code.co_name}'
+    filename = inner.f_code.co_filename
+    line = linecache.getline(filename, inner.f_lineno).strip()
+    location = (
+        f'{os.path.relpath(filename, settings.BASE_DIR)}:{inner.f_lineno} '
+        f'in {inner.f_code.co_name}: {line}'
+    )
+    return view, location
+
+
+def explain(connection, sql, params):
+    """План запроса строками или None, если запрос не SELECT."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params
+        )
+        # В SQLite текст шага — последняя колонка, в остальных базах
+        # она единственная.
+        return [str(row[-1]) for row in cursor.fetchall()]
+    except DatabaseError as error:
+        return [f'EXPLAIN не выполнен: {error}']
+    finally:
+        cursor.close()
+
+
+def record(connection, sql, params, many, duration):
+    view, location = _caller()
+    entry = {
+        'time': round(time.time(), 3),
+        'ms': round(duration * 1000, 3),
+        'db': connection.alias,
+        'fingerprint': fingerprint(sql),
+        'sql': sql,
+        'params': None if is_sensitive(sql) else _params(params, many),
+        'view': view,
+        'frame': location,
+        'plan': None,
+    }
+    if settings.SLOW_QUERY_EXPLAIN and not many:
+        entry['plan'] = explain(connection, sql, params)
+    with _lock:
+        _buffer.append(entry)
+    logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+    return entry
+
+
+def log_slow_query(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if duration * 1000 >= threshold:
+            try:
+                record(context['connection'], sql, params, many, duration)
+            except Exception:
+                errors.exception('Не удалось записать медленный запрос')
+
+
+class PrivateRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler, создающий каталог 0700 и файл 0600."""
+
+    def _open(self):
+        directory = os.path.dirname(self.baseFilename)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(
+            self.baseFilename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+        )
+        return open(fd, self.mode, encoding=self.encoding)
+
+
+def install(sender, connection, **kwargs):
+    connection.execute_wrappers.append(log_slow_query)
+
+
+def load(path):
+    """Записи из файла журнала и его ротированных копий."""
+    paths = [path]
+    while os.path.exists(f'{path}.{len(paths)}'):
+        paths.append(f'{path}.{len(paths)}')
+    entries = []
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return entries
+
+
+def summarize(entries):
+    """Сводка по отпечаткам, самые затратные по суммарному времени
+    первыми: число, сумма, p50, p95 и максимум в мс, представления,
+    нормализованный SQL и план самого медленного запроса.
+    """
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[entry['fingerprint']].append(entry)
+    summary = []
+    for key, rows in groups.items():
+        durations = [row['ms'] for row in rows]
+        slowest = max(rows, key=lambda row: row['ms'])
+        summary.append({
+            'fingerprint': key,
+            'count': len(rows),
+            'total_ms': round(sum(durations), 3),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'max_ms': slowest['ms'],
+            'views': sorted({row['view'] for row in rows if row['view']}),
+            'sql': normalize(slowest['sql']),
+            'frame': slowest['frame'],
+            'plan': slowest['plan'],
+        })
+    summary.sort(key=lambda item: item['total_ms'], reverse=True)
+    return summary
@@ -0,0 +1,335 @@
+"""Кеш в файле SQLite, общий для всех процессов на машине.
+
+LocMemCache у каждого воркера свой: фрагменты лент рисуются в каждом
+процессе заново, а сброс версии в одном процессе не виден другим.
+Этот бэкенд хранит записи в одном файле SQLite в режиме WAL: чтения
+не блокируют друг друга и запись, а запись занимает доли миллисекунды.
+
+Подключается в ``CACHES`` как обычный бэкенд::
+
+    'default': {
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': '/var/lib/yatube/cache/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 2 ** 20},
+    }
+
+Значения читаются через pickle, поэтому файл создаётся с правами 0600
+в каталоге 0700, а чужой файл по этому пути не открывается: кто может
+писать в файл кеша, тот может выполнить код в процессе сайта.
+
+Вытеснение — приближённый LRU: время обращения обновляется не чаще
+раза в ``ACCESS_RESOLUTION`` секунд, чтобы чтение не превращалось
+в запись. Каждые ``CULL_EVERY`` записей процесса удаляются устаревшие
+записи и, если число записей больше ``MAX_ENTRIES`` или их размер
+больше ``MAX_SIZE``, самые давно прочитанные. Границы поэтому мягкие.
+Целые числа хранятся как INTEGER, и ``incr`` — один UPDATE.
+
+Запросы рассчитаны на любую SQLite 3 из сборок Python. ``UPDATE ...
+RETURNING`` (3.35) и оконные функции (3.25) используются, только если
+их поддерживает библиотека, с которой собран модуль sqlite3.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+# Ограничение SQLite на число параметров запроса.
+IN_CHUNK = 900
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+REPLACE = (
+    'INSERT OR REPLACE INTO cache (key, value, expires, accessed, size) '
+    'VALUES (?, ?, ?, ?, ?)'
+)
+
+INSERT_NEW = REPLACE.replace('INSERT OR REPLACE', 'INSERT OR IGNORE')
+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+HAS_WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25)
+
+
+def encode(value):
+    """Значение для столбца value и его размер в байтах."""
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value, 8
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(data)
+
+
+def decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_size = options.get('MAX_SIZE', 64 * 2 ** 20)
+        self.cull_every = options.get('CULL_EVERY', 100)
+        self.access_resolution = options.get('ACCESS_RESOLUTION', 10)
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    @property
+    def db(self):
+        """Соединение текущего потока. После fork создаётся новое."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.db = self._connect()
+            local.pid = os.getpid()
+        return local.db
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        if os.stat(self.path).st_uid != os.getuid():
+            raise ImproperlyConfigured(
+                f'Файл кеша {self.path} принадлежит другому пользователю'
+            )
+        db = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, isolation_level=None,
+            check_same_thread=False,
+        )
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        for statement in SCHEMA:
+            db.execute(statement)
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _wrote(self, count=1):
+        with self._writes_lock:
+            self._writes += count
+            due = self._writes >= self.cull_every
+            if due:
+                self._writes = 0
+        if due:
+            self.cull()
+
+    def _touch_rows(self, keys, now):
+        if keys:
+            self.db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys],
+            )
+
+    def _fetch(self, keys):
+        """{ключ: значение} живых записей, с отметкой обращения."""
+        now = time.time()
+        found = {}
+        stale = []
+        for start in range(0, len(keys), IN_CHUNK):
+            chunk = keys[start:start + IN_CHUNK]
+            marks = ', '.join('?' * len(chunk))
+            rows = self.db.execute(
+                f'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({marks})', chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = value
+                if accessed < now - self.access_resolution:
+                    stale.append(key)
+        self._touch_rows(stale, now)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._fetch([key])
+        if key not in found:
+            return default
+        return decode(found[key])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(made))
+        return {made[key]: decode(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        value, size = encode(value)
+        self.db.execute(
+            REPLACE, (key, value, self._expires(timeout), time.time(), size)
+        )
+        self._wrote()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            value, size = encode(value)
+            rows.append((self._key(key, version), value, expires, now, size))
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.executemany(REPLACE, rows)
+        self._wrote(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        value, size = encode(value)
+        now = time.time()
+        # Запись заменяется, только если она устарела.
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            cursor = self.db.execute(
+                INSERT_NEW,
+                (key, value, self._expires(timeout), now, size),
+            )
+        self._wrote()
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self.db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def _incr_integer(self, key, delta, now):
+        """Новое значение целой записи или None, если запись не целая
+        или её нет.
+        """
+        update = (
+            "UPDATE cache SET value = value + ? WHERE key = ? "
+            "AND typeof(value) = 'integer' "
+            "AND (expires IS NULL OR expires > ?)"
+        )
+        if HAS_RETURNING:
+            # fetchall() дочитывает RETURNING, иначе запрос не завершится
+            # и не снимет блокировку записи.
+            rows = self.db.execute(
+                update + ' RETURNING value', (delta, key, now)
+            ).fetchall()
+            return rows[0][0] if rows else None
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            if not self.db.execute(update, (delta, key, now)).rowcount:
+                return None
+            return self.db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()[0]
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self._incr_integer(key, delta, time.time())
+        if value is not None:
+            return value
+        # Не целое число: читаем и пишем в одной транзакции.
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            found = self._fetch([key])
+            if key not in found:
+                raise ValueError(f"Key '{key}' not found")
+            value, size = encode(decode(found[key]) + delta)
+            self.db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (value, size, key),
+            )
+        return decode(value)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self.db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+            )
+
+    def clear(self):
+        self.db.execute('DELETE FROM cache')
+
+    def cull(self):
+        """Удаляет устаревшие записи и, если границы превышены, самые
+        давно прочитанные: не меньше 1/CULL_FREQUENCY записей и столько,
+        чтобы остальные уместились в MAX_SIZE.
+        """
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            count, size = self.db.execute(
+                'SELECT COUNT(*), TOTAL(size) FROM cache'
+            ).fetchone()
+            if count > self._max_entries:
+                excess = count - self._max_entries
+                self.db.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY accessed LIMIT ?)',
+                    (max(excess, count // self._cull_frequency),),
+                )
+            if size > self.max_size:
+                self._cull_size(self.max_size * (1 - 1 / self._cull_frequency))
+
+    def _cull_size(self, keep):
+        """Удаляет давно прочитанные записи сверх keep байт."""
+        if HAS_WINDOW_FUNCTIONS:
+            self.db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM '
+                '(SELECT key, SUM(size) OVER (ORDER BY accessed DESC) '
+                'AS total FROM cache) WHERE total > ?)', (keep,),
+            )
+            return
+        total = 0
+        excess = []
+        rows = self.db.execute(
+            'SELECT key, size FROM cache ORDER BY accessed DESC'
+        ).fetchall()
+        for key, size in rows:
+            total += size
+            if total > keep:
+                excess.append((key,))
+        self.db.executemany('DELETE FROM cache WHERE key = ?', excess)
+
+    def stats(self):
+        """Число записей и их размер в байтах."""
+        count, size = self.db.execute(
+            'SELECT COUNT(*), TOTAL(size) FROM cache'
+        ).fetchone()
+        return {'entries': count, 'bytes': int(size)}
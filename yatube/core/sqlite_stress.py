@@ -0,0 +1,168 @@
+"""Нагрузочная проверка SQLite с одновременными записями и чтениями.
+
+Во временном файле создаются таблицы постов и комментариев. Писатели
+повторяют запросы ``post_create`` и ``add_comment``: новый пост или
+комментарий и обновление счётчика комментариев поста, каждый запрос
+в своей транзакции, как в представлениях. Читатели в это время листают
+ленту. Каждый поток открывает своё соединение, как воркер сайта.
+
+Прогон делается для трёх профилей: без ожидания занятой базы
+(``busy_timeout=0``), как есть (журнал отката и пятисекундное ожидание
+из модуля sqlite3) и ``SQLITE_PRAGMAS``. Считаются ошибки «database is
+locked», записи в секунду и задержка чтения ленты.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+
+from .instrumentation import percentile
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+    'comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, '
+    'post_id INTEGER NOT NULL REFERENCES post (id), text TEXT)',
+    'CREATE INDEX comment_post ON comment (post_id)',
+)
+TEXT = 'Текст поста. ' * 40
+FEED = (
+    'SELECT post.id, post.text, post.comments_count, '
+    '(SELECT count(*) FROM comment WHERE comment.post_id = post.id) '
+    'FROM post ORDER BY post.comments_count DESC, post.id DESC LIMIT 10'
+)
+
+
+def open_connection(path, pragmas):
+    settings_dict = {
+        **connections['default'].settings_dict,
+        'NAME': path,
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+        'PRAGMAS': pragmas,
+    }
+    connection = DatabaseWrapper(settings_dict, alias='stress')
+    connection.ensure_connection()
+    return connection
+
+
+def _write(cursor, i):
+    if i % 4 == 0:
+        cursor.execute('INSERT INTO post (text) VALUES (%s)', [TEXT])
+        return
+    cursor.execute(
+        'INSERT INTO comment (post_id, text) '
+        'VALUES ((SELECT max(id) FROM post), %s)', [TEXT[:200]]
+    )
+    cursor.execute(
+        'UPDATE post SET comments_count = comments_count + 1 '
+        'WHERE id = (SELECT max(id) FROM post)'
+    )
+
+
+def _writer(path, pragmas, writes, result):
+    connection = open_connection(path, pragmas)
+    try:
+        with connection.cursor() as cursor:
+            for i in range(writes):
+                try:
+                    _write(cursor, i)
+                    result['writes'] += 1
+                except OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+                    result['locked'] += 1
+    finally:
+        connection.close()
+
+
+def _reader(path, pragmas, stop, result):
+    connection = open_connection(path, pragmas)
+    try:
+        with connection.cursor() as cursor:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    cursor.execute(FEED)
+                    cursor.fetchall()
+                except OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+                    result['locked'] += 1
+                    continue
+                result['reads'].append(
+                    (time.perf_counter() - start) * 1000
+                )
+    finally:
+        connection.close()
+
+
+def stress(pragmas, writers=8, readers=4, writes=200, path=None):
+    """Один прогон; возвращает ошибки, записи в секунду и p95 чтения."""
+    directory = None
+    if path is None:
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, 'stress.sqlite3')
+    setup = open_connection(path, pragmas)
+    with setup.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        cursor.execute('INSERT INTO post (text) VALUES (%s)', [TEXT])
+    setup.close()
+
+    results = [{'writes': 0, 'locked': 0} for _ in range(writers)]
+    reads = [{'reads': [], 'locked': 0} for _ in range(readers)]
+    stop = threading.Event()
+    write_threads = [
+        threading.Thread(
+            target=_writer, args=(path, pragmas, writes, result)
+        )
+        for result in results
+    ]
+    read_threads = [
+        threading.Thread(target=_reader, args=(path, pragmas, stop, result))
+        for result in reads
+    ]
+    start = time.perf_counter()
+    for thread in read_threads + write_threads:
+        thread.start()
+    for thread in write_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in read_threads:
+        thread.join()
+    if directory is not None:
+        directory.cleanup()
+
+    latencies = [ms for result in reads for ms in result['reads']]
+    return {
+        'locked': sum(result['locked'] for result in results + reads),
+        'writes': sum(result['writes'] for result in results),
+        'writes_per_s': round(
+            sum(result['writes'] for result in results) / elapsed
+        ),
+        'reads': len(latencies),
+        'read_p95_ms': round(percentile(latencies, 95), 2)
+        if latencies else None,
+    }
+
+
+def profiles():
+    return {
+        'no wait': {'busy_timeout': 0},
+        'default': {},
+        'tuned': settings.SQLITE_PRAGMAS,
+    }
+
+
+def run(writers=8, readers=4, writes=200):
+    """{профиль: результат} для каждого профиля из profiles()."""
+    return {
+        name: stress(pragmas, writers, readers, writes)
+        for name, pragmas in profiles().items()
+    }
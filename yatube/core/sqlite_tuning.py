@@ -0,0 +1,70 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+При каждом новом соединении (сигнал ``connection_created``) к базе на
+SQLite применяются PRAGMA из ``SQLITE_PRAGMAS``; у отдельной базы их
+можно заменить ключом ``PRAGMAS`` в её записи ``DATABASES``. Порядок
+важен: сначала ``busy_timeout``, чтобы смена журнала ждала блокировку,
+а не падала.
+
+- ``journal_mode=WAL`` — читатели не блокируют писателя и наоборот;
+  режим хранится в файле базы, для базы в памяти он не меняется;
+- ``synchronous=NORMAL`` — в WAL fsync только при checkpoint, а не на
+  каждый коммит; при сбое питания теряются последние коммиты, но база
+  остаётся целой;
+- ``busy_timeout`` — сколько миллисекунд ждать занятую базу, прежде
+  чем вернуть «database is locked»;
+- ``mmap_size``, ``cache_size``, ``temp_store`` — чтение через
+  отображение файла в память, кеш страниц соединения и временные
+  таблицы сортировок в памяти.
+
+``mmap_size`` и ``cache_size`` живут, пока живёт соединение, поэтому
+вместе с ними стоит держать соединения открытыми (``CONN_MAX_AGE``).
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ORDER = ('busy_timeout', 'journal_mode', 'synchronous')
+
+
+def get_pragmas(connection):
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    return sorted(
+        pragmas.items(),
+        key=lambda item: (
+            ORDER.index(item[0]) if item[0] in ORDER else len(ORDER)
+        ),
+    )
+
+
+def apply_pragmas(connection):
+    """Выполняет PRAGMA для соединения и возвращает {имя: результат}."""
+    # Напрямую через sqlite3, мимо обёрток курсора: PRAGMA не должны
+    # попадать в счётчики запросов.
+    db = connection.connection
+    pragmas = get_pragmas(connection)
+    applied = {}
+    for name, value in pragmas:
+        db.execute(f'PRAGMA {name} = {value}')
+        # mmap_size у базы в памяти ничего не возвращает.
+        row = db.execute(f'PRAGMA {name}').fetchone()
+        applied[name] = row and row[0]
+    mode = dict(pragmas).get('journal_mode')
+    if (
+        mode and applied['journal_mode'] != mode.lower()
+        and not connection.is_in_memory_db()
+    ):
+        logger.warning(
+            'SQLite %s: journal_mode=%s вместо %s',
+            connection.alias, applied['journal_mode'], mode,
+        )
+    return applied
+
+
+def tune_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
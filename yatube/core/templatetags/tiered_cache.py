@@ -0,0 +1,80 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from core import tiered_cache
+
+register = template.Library()
+
+
+class TieredCacheNode(CacheNode):
+    """Фрагмент в двухуровневом кеше core.tiered_cache."""
+
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 version_var):
+        super().__init__(
+            nodelist, expire_time_var, fragment_name, vary_on, None
+        )
+        self.version_var = version_var
+
+    def render(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                f'"cache" tag got an unknown variable: '
+                f'{self.expire_time_var.var!r}'
+            )
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'"cache" tag got a non-integer timeout value: '
+                    f'{expire_time!r}'
+                )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        version = None
+        if self.version_var is not None:
+            version = self.version_var.resolve(context)
+        return tiered_cache.get_or_set(
+            key, lambda: self.nodelist.render(context), expire_time,
+            version=version,
+        )
+
+
+@register.tag('cache')
+def do_tiered_cache(parser, token):
+    """Замена ``{% cache %}`` с тем же синтаксисом и версией данных::
+
+        {% load tiered_cache %}
+        {% cache 3600 index_page order page version=feed_version %}
+        ...
+        {% endcache %}
+
+    Версия не входит в ключ: после её смены один процесс
+    перерисовывает фрагмент, а остальные ждут его, прошлый не отдаётся.
+
+    Параметр ``using`` не поддерживается: кеш второго уровня задаёт
+    ``TIERED_CACHE_ALIAS``.
+    """
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    version_var = None
+    if len(tokens) > 3 and tokens[-1].startswith('version='):
+        version_var = parser.compile_filter(tokens.pop()[len('version='):])
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    if tokens[-1].startswith('using='):
+        raise template.TemplateSyntaxError(
+            '"cache" из tiered_cache не принимает using='
+        )
+    return TieredCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        version_var,
+    )
@@ -0,0 +1,79 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from posts.fragments import get_feed_version
+from posts.models import Follow, Group, Post, User
+
+from core import benchmark
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+        )
+        Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_run_measures_views_and_rolls_back(self):
+        """Замер проходит по всем представлениям и не меняет базу."""
+        results = benchmark.run(requests=3, warmup=1, memory_requests=1)
+        self.assertEqual(set(results['views']), set(benchmark.VIEWS))
+        row = results['views']['index']
+        self.assertGreater(row['latency_ms']['p50'], 0)
+        self.assertGreater(row['peak_kb'], 0)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_run_leaves_site_cache_alone(self):
+        """Откаченные посты не меняют версию ленты в кеше сайта."""
+        version = get_feed_version()
+        cache.set('marker', 1)
+        benchmark.run(
+            views=['create', 'index'], requests=2, warmup=0,
+            memory_requests=1,
+        )
+        self.assertEqual(get_feed_version(), version)
+        self.assertEqual(cache.get('marker'), 1)
+
+    def test_empty_database(self):
+        """Без данных команда сообщает, что нужен seed."""
+        Follow.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('benchmark', stdout=StringIO())
+
+    def test_compare_flags_regressions(self):
+        """benchmark_compare находит рост времени и числа запросов."""
+        baseline = os.path.join(self.dir.name, 'baseline.json')
+        current = os.path.join(self.dir.name, 'latest.json')
+        with override_settings(BENCHMARK_BASELINE=baseline):
+            call_command(
+                'benchmark', views=['index'], requests=2, warmup=0,
+                memory_requests=1, output=current, save_baseline=True,
+                stdout=StringIO(),
+            )
+            call_command('benchmark_compare', current, stdout=StringIO())
+            results = benchmark.load(current)
+            row = results['views']['index']
+            row['latency_ms']['p95'] = row['latency_ms']['p95'] * 2 + 10
+            row['queries']['max'] += 1
+            benchmark.save(results, current)
+            out = StringIO()
+            with self.assertRaises(CommandError):
+                call_command('benchmark_compare', current, stdout=out)
+        self.assertIn('latency p95', out.getvalue())
+        self.assertIn('queries', out.getvalue())
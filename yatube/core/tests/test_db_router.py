@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from posts import page_cache, thumbnails, timeline
+from posts.models import Post
+
+from core import db_router
+from core.management.commands.sync_replicas import copy_sqlite
+
+REPLICAS = {'replica1': 3, 'replica2': 1}
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        db_router.reset()
+        self.addCleanup(db_router.reset)
+        self.router = db_router.ReplicaRouter()
+
+    def read_in_new_request(self):
+        db_router.reset()
+        return self.router.db_for_read(Post)
+
+    def test_weighted_reads(self):
+        """Запросы расходятся по репликам пропорционально весам."""
+        reads = Counter(self.read_in_new_request() for _ in range(4000))
+        self.assertEqual(set(reads), set(REPLICAS))
+        self.assertTrue(2.5 < reads['replica1'] / reads['replica2'] < 3.5)
+
+    def test_one_replica_per_request(self):
+        """Все чтения одного запроса идут на одну реплику."""
+        for _ in range(20):
+            first = self.read_in_new_request()
+            self.assertEqual(
+                {self.router.db_for_read(Post) for _ in range(50)}, {first}
+            )
+
+    def test_no_replicas(self):
+        """Без реплик всё читается с default."""
+        with override_settings(DATABASE_REPLICAS={}):
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_after_write_go_to_primary(self):
+        """После записи поток читает с default."""
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+    def test_primary_block(self):
+        """Внутри primary() чтения идут с default, после — снова
+        с реплики.
+        """
+        with db_router.primary():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(db_router.is_pinned())
+        self.assertIn(self.router.db_for_read(Post), REPLICAS)
+
+    def test_background_jobs_read_primary(self):
+        """Фоновые задачи после записи читают с default."""
+        jobs = (
+            (page_cache, 'warm', None),
+            (thumbnails, 'generate', 'small.gif'),
+            (timeline, 'catch_up', 1),
+        )
+        for module, name, argument in jobs:
+            with self.subTest(job=name):
+                reads = []
+                with mock.patch.object(
+                    module, name,
+                    lambda *args: reads.append(
+                        self.router.db_for_read(Post)
+                    ),
+                ):
+                    module._work(argument)
+                self.assertEqual(reads, ['default'])
+                self.assertFalse(db_router.is_pinned())
+
+    def test_middleware_pins_user_after_write(self):
+        """После записи ставится cookie, с ней чтения идут с default."""
+        reads = []
+
+        def view(request):
+            if request.method == 'POST':
+                self.router.db_for_write(Post)
+            reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        middleware = db_router.ReplicaPinMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.post('/create/'))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        self.assertFalse(db_router.is_pinned())
+
+        request = factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        response = middleware(request)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(reads, ['default', 'default'])
+        middleware(factory.get('/'))
+        self.assertIn(reads[-1], REPLICAS)
+
+        with override_settings(DATABASE_REPLICAS={}):
+            with self.assertRaises(MiddlewareNotUsed):
+                db_router.ReplicaPinMiddleware(view)
+
+    def test_copy_sqlite(self):
+        """sync_replicas копирует файл SQLite целиком."""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'db.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            db = sqlite3.connect(source)
+            db.execute('CREATE TABLE post (text TEXT)')
+            db.execute("INSERT INTO post VALUES ('Пост')")
+            db.commit()
+            db.close()
+            copy_sqlite(source, target)
+            db = sqlite3.connect(target)
+            self.assertEqual(
+                db.execute('SELECT text FROM post').fetchall(), [('Пост',)]
+            )
+            db.close()
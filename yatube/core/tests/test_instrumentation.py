@@ -0,0 +1,95 @@
+import json
+import os
+import stat
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+from core.instrumentation import dump, histogram, load
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_FLUSH_EVERY=1)
+class InstrumentationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True
+        )
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        histogram.clear()
+        self.dump_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dump_dir.cleanup)
+        self.settings_override = override_settings(
+            INSTRUMENTATION_DUMP_DIR=self.dump_dir.name
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_server_timing_header_and_histogram(self):
+        """Ответ содержит Server-Timing, замер попадает в окно."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'TestAuthor'})
+        )
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        queries, sql_ms, template_ms, total_ms = (
+            histogram.samples()['posts:profile'][0]
+        )
+        self.assertGreater(queries, 0)
+        self.assertGreater(template_ms, 0)
+        self.assertGreaterEqual(total_ms, template_ms)
+
+    def test_timings_command_reads_dumps(self):
+        """Команда timings сводит сохранённые замеры."""
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('timings', stdout=out)
+        self.assertIn('posts:index', out.getvalue())
+
+    def test_timings_url_is_staff_only(self):
+        """Страница замеров доступна только персоналу."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('timings'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('timings'))
+        self.assertIn('posts:index', response.json())
+
+    def test_private_dump_dir(self):
+        """Каталог замеров закрыт для других пользователей, чужой каталог
+        и испорченные файлы не читаются.
+        """
+        directory = os.path.join(self.dump_dir.name, 'timings')
+        histogram.add('posts:index', (1, 1.0, 1.0, 2.0))
+        dump(directory)
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        with open(os.path.join(directory, 'broken.json'), 'w') as file:
+            file.write('{')
+        self.assertEqual(
+            json.loads(json.dumps(load(directory))),
+            {'posts:index': [[1, 1.0, 1.0, 2.0]]},
+        )
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(ImproperlyConfigured):
+                load(directory)
+            with self.assertRaises(ImproperlyConfigured):
+                dump(directory)
+
+
+class InstrumentationDisabledTest(TestCase):
+    def test_no_header_when_disabled(self):
+        """Выключенная middleware не добавляет заголовок."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.test import TestCase
+from posts.models import Group
+
+from core import object_cache
+
+
+class ObjectCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        object_cache.reset_stats()
+
+    def test_second_lookup_is_served_from_cache(self):
+        """Повторный запрос объекта по slug не обращается к базе."""
+        object_cache.get(Group, slug=self.group.slug)
+        with self.assertNumQueries(0):
+            group = object_cache.get(Group, slug=self.group.slug)
+        self.assertEqual(group, self.group)
+        self.assertEqual(object_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_save_invalidates_cached_object(self):
+        """Сохранение объекта сбрасывает кеш, старый slug не находится."""
+        object_cache.get(Group, pk=self.group.pk)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+        self.assertEqual(
+            object_cache.get(Group, pk=self.group.pk).slug, 'new-slug'
+        )
+        with self.assertRaises(Http404):
+            object_cache.get_or_404(Group, slug='test-slug')
+
+    def test_get_many_fetches_missing_in_one_query(self):
+        """get_many выбирает недостающие объекты одним запросом."""
+        other = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание',
+        )
+        object_cache.get(Group, pk=self.group.pk)
+        with self.assertNumQueries(1):
+            groups = object_cache.get_many(Group, [self.group.pk, other.pk])
+        self.assertEqual(groups, {self.group.pk: self.group, other.pk: other})
+        with self.assertNumQueries(0):
+            object_cache.get_many(Group, [self.group.pk, other.pk])
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import stat
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+from core import slow_queries
+
+
+class SlowQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='TestAuthor')
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        slow_queries.clear()
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_view_queries_logged_with_plan(self):
+        """Запрос ленты попадает в журнал с представлением, строкой
+        из posts.views и планом.
+        """
+        with self.assertLogs('yatube.slow_queries') as logs:
+            self.client.get(reverse('posts:index'))
+        entries = slow_queries.recent()
+        self.assertEqual(len(logs.records), len(entries))
+        self.assertEqual(json.loads(logs.records[0].getMessage()), entries[0])
+        feed = [
+            entry for entry in entries
+            if entry['view'] == 'posts.views.index'
+            and 'posts_post' in entry['sql']
+        ]
+        self.assertTrue(feed)
+        self.assertRegex(feed[0]['frame'], r'^posts/views\.py:\d+ in ')
+        self.assertTrue(feed[0]['plan'])
+        self.assertRegex(' '.join(feed[0]['plan']), r'SCAN|SEARCH')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=10 ** 6)
+    def test_fast_queries_skipped(self):
+        """Быстрые запросы не записываются."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(slow_queries.recent(), [])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_writes_have_no_plan(self):
+        """У INSERT нет плана, запросы вне posts.views без представления."""
+        with self.assertLogs('yatube.slow_queries'):
+            Post.objects.create(author=self.author, text='Ещё пост')
+        insert = next(
+            entry for entry in slow_queries.recent()
+            if entry['sql'].startswith('INSERT')
+        )
+        self.assertIsNone(insert['plan'])
+        self.assertIsNone(insert['view'])
+        self.assertIsNone(insert['params'])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_sensitive_params_not_logged(self):
+        """Параметры пишутся только для SELECT вне таблиц пользователей
+        и сессий.
+        """
+        with self.assertLogs('yatube.slow_queries'):
+            list(Post.objects.filter(text='Тестовый пост'))
+            User.objects.filter(username='TestAuthor').exists()
+        entries = slow_queries.recent()
+        posts = next(e for e in entries if 'posts_post' in e['sql'])
+        users = next(e for e in entries if 'auth_user' in e['sql'])
+        self.assertEqual(posts['params'], ['Тестовый пост'])
+        self.assertIsNone(users['params'])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_recording_errors_do_not_break_queries(self):
+        """Сбой записи в журнал не мешает результату запроса."""
+        with mock.patch.object(
+            slow_queries, 'record', side_effect=ValueError('сбой'),
+        ), self.assertLogs('core.slow_queries', 'ERROR'):
+            self.assertEqual(Post.objects.count(), 1)
+
+    def test_private_log_file(self):
+        """Журнал создаётся в каталоге 0700 с правами 0600."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'logs', 'slow.log')
+            handler = slow_queries.PrivateRotatingFileHandler(
+                path, delay=True, encoding='utf-8',
+            )
+            handler.emit(logging.makeLogRecord({'msg': 'запись'}))
+            handler.close()
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+            self.assertEqual(
+                stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700
+            )
+
+    def test_fingerprint(self):
+        """Литералы и списки IN не меняют отпечаток."""
+        self.assertEqual(
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE id IN (%s, %s) AND a = 'x'"
+            ),
+            slow_queries.fingerprint(
+                "SELECT *  FROM t WHERE id IN (%s) AND a = 'it''s'"
+            ),
+        )
+        self.assertNotEqual(
+            slow_queries.fingerprint('SELECT * FROM t WHERE id = %s'),
+            slow_queries.fingerprint('SELECT * FROM u WHERE id = %s'),
+        )
+
+    def test_command_summary(self):
+        """Команда сводит записи журнала и его копий по отпечаткам."""
+        def entry(sql, ms):
+            return {
+                'fingerprint': slow_queries.fingerprint(sql), 'sql': sql,
+                'ms': ms, 'view': 'posts.views.index', 'frame': None,
+                'plan': ['SCAN posts_post'],
+            }
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.log')
+            with open(path, 'w') as file:
+                for sql, ms in (('SELECT 1 FROM a WHERE id = 1', 150),
+                                ('SELECT 1 FROM a WHERE id = 2', 250)):
+                    file.write(json.dumps(entry(sql, ms)) + '\n')
+            with open(f'{path}.1', 'w') as file:
+                file.write(json.dumps(entry('SELECT 2 FROM b', 120)) + '\n')
+                file.write('не JSON\n')
+            out = StringIO()
+            call_command('slow_queries', file=path, json=True, stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual(len(summary), 2)
+        self.assertEqual(summary[0]['count'], 2)
+        self.assertEqual(summary[0]['total_ms'], 400)
+        self.assertEqual(summary[0]['max_ms'], 250)
+        self.assertEqual(summary[0]['sql'], 'SELECT ? FROM a WHERE id = ?')
+        self.assertEqual(summary[0]['views'], ['posts.views.index'])
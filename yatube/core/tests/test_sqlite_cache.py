@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import sqlite3
+import stat
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from posts.fragments import bump_feed_version
+
+from core import sqlite_cache
+from core.sqlite_cache import SQLiteCache
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """get/set/add/delete/many и срок жизни как у бэкендов Django."""
+        cache = self.cache
+        cache.set('post', {'text': 'Пост'})
+        self.assertEqual(cache.get('post'), {'text': 'Пост'})
+        self.assertFalse(cache.add('post', 'другой'))
+        self.assertTrue(cache.add('new', 'значение'))
+        cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(cache.get('expired'))
+        self.assertTrue(cache.add('expired', 2))
+        cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 'два'}
+        )
+        cache.delete_many(['a', 'b'])
+        self.assertFalse(cache.has_key('a'))
+        self.assertTrue(cache.touch('post', 100))
+        cache.clear()
+        self.assertIsNone(cache.get('post'))
+
+    def test_incr(self):
+        """incr работает с целыми и прочими числами, без ключа — ошибка."""
+        self.cache.set('count', 1)
+        self.assertEqual(self.cache.incr('count', 10), 11)
+        self.assertEqual(self.cache.decr('count'), 10)
+        self.cache.set('float', 1.5)
+        self.assertEqual(self.cache.incr('float'), 2.5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_old_sqlite(self):
+        """Без RETURNING и оконных функций incr и вытеснение по размеру
+        работают так же.
+        """
+        with mock.patch.multiple(
+            sqlite_cache, HAS_RETURNING=False, HAS_WINDOW_FUNCTIONS=False,
+        ):
+            self.cache.set('count', 1)
+            self.assertEqual(self.cache.incr('count', 10), 11)
+            self.assertEqual(self.cache.incr('count'), 12)
+            with self.assertRaises(ValueError):
+                self.cache.incr('missing')
+            cache = self.make_cache(MAX_SIZE=10000, CULL_EVERY=1)
+            for i in range(20):
+                cache.set(f'key{i}', 'x' * 1000)
+            self.assertLessEqual(cache.stats()['bytes'], 10000)
+            self.assertIsNotNone(cache.get('key19'))
+
+    def test_private_file(self):
+        """Каталог и файл кеша закрыты для других пользователей."""
+        path = os.path.join(self.dir.name, 'private', 'cache.sqlite3')
+        SQLiteCache(path, {}).set('key', 1)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertEqual(
+            stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700
+        )
+
+    def test_bump_version_survives_backend_errors(self):
+        """Сбой кеша при смене версии не роняет сохранение."""
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'core.sqlite_cache.SQLiteCache',
+            'LOCATION': self.path,
+        }}), mock.patch.object(
+            SQLiteCache, 'incr',
+            side_effect=sqlite3.OperationalError('database is locked'),
+        ), self.assertLogs('posts.fragments', 'ERROR'):
+            self.assertIsNone(bump_feed_version())
+
+    def test_shared_between_processes(self):
+        """Процессы видят записи друг друга, incr не теряет изменений."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.path, 200))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_eviction_keeps_recently_read(self):
+        """Сверх MAX_ENTRIES вытесняются давно прочитанные записи."""
+        cache = self.make_cache(
+            MAX_ENTRIES=10, CULL_EVERY=1, ACCESS_RESOLUTION=0,
+        )
+        cache.set('hot', 'часто читаемая')
+        for i in range(30):
+            cache.set(f'key{i}', i)
+            time.sleep(0.001)
+            cache.get('hot')
+        self.assertLessEqual(cache.stats()['entries'], 10)
+        self.assertEqual(cache.get('hot'), 'часто читаемая')
+        self.assertIsNone(cache.get('key0'))
+
+    def test_eviction_by_size(self):
+        """Сверх MAX_SIZE удаляются старые записи."""
+        cache = self.make_cache(MAX_SIZE=10000, CULL_EVERY=1)
+        for i in range(20):
+            cache.set(f'key{i}', 'x' * 1000)
+        self.assertLessEqual(cache.stats()['bytes'], 10000)
+        self.assertIsNotNone(cache.get('key19'))
+
+    def test_drop_in_for_caches(self):
+        """Бэкенд подключается через CACHES."""
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'core.sqlite_cache.SQLiteCache',
+            'LOCATION': self.path,
+        }}):
+            cache = caches['default']
+            cache.set('key', 'значение')
+            self.assertEqual(self.cache.get('key'), 'значение')
+
+    def test_benchmark_command(self):
+        """Команда сравнивает бэкенды и показывает общий доступ."""
+        out = StringIO()
+        call_command(
+            'cache_benchmark', operations=40, workers=2,
+            location=self.path, stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertIn('locmem', lines[0])
+        self.assertEqual(lines[-1].split()[-2:], ['0', '100'])
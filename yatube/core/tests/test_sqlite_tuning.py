@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, override_settings
+
+from core import sqlite_stress, sqlite_tuning
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -4000,
+    'busy_timeout': 3000,
+}
+
+
+class SQLiteTuningTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def test_pragmas_applied_on_connect(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        with override_settings(SQLITE_PRAGMAS=PRAGMAS):
+            db = sqlite_stress.open_connection(self.path, None)
+        self.addCleanup(db.close)
+        pragma = db.connection.execute
+        self.assertEqual(pragma('PRAGMA journal_mode').fetchone(), ('wal',))
+        self.assertEqual(pragma('PRAGMA synchronous').fetchone(), (1,))
+        self.assertEqual(pragma('PRAGMA temp_store').fetchone(), (2,))
+        self.assertEqual(pragma('PRAGMA cache_size').fetchone(), (-4000,))
+        self.assertEqual(pragma('PRAGMA busy_timeout').fetchone(), (3000,))
+
+    def test_database_pragmas_override_settings(self):
+        """Ключ PRAGMAS у базы заменяет SQLITE_PRAGMAS."""
+        db = sqlite_stress.open_connection(self.path, {'busy_timeout': 0})
+        self.addCleanup(db.close)
+        self.assertEqual(
+            sqlite_tuning.get_pragmas(db), [('busy_timeout', 0)]
+        )
+        self.assertEqual(
+            db.connection.execute('PRAGMA journal_mode').fetchone(),
+            ('delete',),
+        )
+
+    def test_busy_timeout_first(self):
+        """busy_timeout выставляется раньше смены журнала."""
+        self.assertEqual(
+            sqlite_tuning.get_pragmas(connection)[:3],
+            [
+                ('busy_timeout', 5000),
+                ('journal_mode', 'WAL'),
+                ('synchronous', 'NORMAL'),
+            ],
+        )
+
+    def test_locked_write_waits_with_busy_timeout(self):
+        """Пока другое соединение держит запись, без ожидания запись
+        падает, а с SQLITE_PRAGMAS дожидается коммита.
+        """
+        holder = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        self.addCleanup(holder.close)
+        # Смена журнала не ждёт занятую базу, поэтому WAL включается
+        # до того, как запись начата.
+        holder.execute('PRAGMA journal_mode = WAL')
+        holder.execute('CREATE TABLE post (id INTEGER PRIMARY KEY)')
+        holder.execute('BEGIN IMMEDIATE')
+        holder.execute('INSERT INTO post DEFAULT VALUES')
+
+        no_wait = sqlite_stress.open_connection(
+            self.path, {'busy_timeout': 0}
+        )
+        self.addCleanup(no_wait.close)
+        with no_wait.cursor() as cursor:
+            with self.assertRaisesMessage(OperationalError, 'locked'):
+                cursor.execute('INSERT INTO post DEFAULT VALUES')
+
+        commit = threading.Timer(0.2, holder.execute, args=('COMMIT',))
+        commit.start()
+        self.addCleanup(commit.join)
+        tuned = sqlite_stress.open_connection(
+            self.path, sqlite_stress.profiles()['tuned']
+        )
+        self.addCleanup(tuned.close)
+        with tuned.cursor() as cursor:
+            cursor.execute('INSERT INTO post DEFAULT VALUES')
+            cursor.execute('SELECT count(*) FROM post')
+            self.assertEqual(cursor.fetchone(), (2,))
+
+    def test_concurrent_writes_not_locked(self):
+        """Под одновременной нагрузкой с SQLITE_PRAGMAS проходят все
+        записи.
+        """
+        load = {'writers': 4, 'readers': 2, 'writes': 100}
+        tuned = sqlite_stress.stress(
+            sqlite_stress.profiles()['tuned'], **load
+        )
+        self.assertEqual(tuned['locked'], 0)
+        self.assertEqual(tuned['writes'], 400)
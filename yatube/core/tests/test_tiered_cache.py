@@ -0,0 +1,132 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase
+
+from core import tiered_cache
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        tiered_cache.clear_local()
+
+    def test_levels(self):
+        """Повтор берётся из L1, после сброса L1 — из L2."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'значение'
+
+        for _ in range(2):
+            value = tiered_cache.get_or_set('key', compute, 60)
+        self.assertEqual(value, 'значение')
+        self.assertEqual(tiered_cache.stats()['l1_hits'], 1)
+        tiered_cache.clear_local()
+        tiered_cache.get_or_set('key', compute, 60)
+        self.assertEqual(tiered_cache.stats()['l2_hits'], 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_while_locked(self):
+        """Пока другой процесс пересчитывает, отдаётся старое значение."""
+        cache.set('key', ('старое', time.time() - 1, 0.1, None), 60)
+        cache.add('key:lock', 1)
+        value = tiered_cache.get_or_set('key', lambda: 'новое', 60)
+        self.assertEqual(value, 'старое')
+        self.assertEqual(tiered_cache.stats()['stale'], 1)
+        cache.delete('key:lock')
+        tiered_cache.clear_local()
+        self.assertEqual(
+            tiered_cache.get_or_set('key', lambda: 'новое', 60), 'новое'
+        )
+
+    def test_old_version_never_served(self):
+        """После смены версии, пока пересчитывает другой процесс,
+        ожидается его значение новой версии, а не отдаётся прошлое.
+        """
+        tiered_cache.get_or_set('key', lambda: 'v1', 60, version=1)
+        cache.add('key:lock', 1)
+
+        def finish():
+            cache.set('key', ('v2', time.time() + 60, 0.1, 2), 60)
+            cache.delete('key:lock')
+
+        threading.Timer(0.1, finish).start()
+        self.assertEqual(
+            tiered_cache.get_or_set('key', lambda: 'своё', 60, version=2),
+            'v2',
+        )
+        self.assertNotIn('stale', tiered_cache.stats())
+
+    def test_waiters_stop_when_compute_fails(self):
+        """Если пересчёт упал и блокировка снята, ожидающие не ждут
+        до конца срока блокировки, а считают сами.
+        """
+        cache.add('key:lock', 1)
+        threading.Timer(0.1, cache.delete, args=('key:lock',)).start()
+        start = time.time()
+        self.assertEqual(
+            tiered_cache.get_or_set('key', lambda: 'своё', 60), 'своё'
+        )
+        self.assertLess(time.time() - start, 1)
+
+    def test_single_flight(self):
+        """Холодный ключ из многих потоков считается один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'значение'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                tiered_cache.get_or_set('feed', compute, 60)
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['значение'] * 8)
+
+    def test_early_refresh(self):
+        """Пересчёт вероятен только у конца срока."""
+        now = time.time()
+        self.assertFalse(tiered_cache.should_refresh(None, 1, now))
+        self.assertFalse(tiered_cache.should_refresh(now + 3600, 0.01, now))
+        self.assertTrue(tiered_cache.should_refresh(now - 1, 0.01, now))
+        refreshed = sum(
+            tiered_cache.should_refresh(now + 1, 1, now)
+            for _ in range(1000)
+        )
+        self.assertTrue(200 < refreshed < 600)
+
+    def test_template_tag(self):
+        """{% cache %} из tiered_cache кеширует фрагмент."""
+        template = Template(
+            '{% load tiered_cache %}'
+            '{% cache 60 fragment part %}{{ value }}{% endcache %}'
+        )
+        render = template.render
+        self.assertEqual(render(Context({'part': 1, 'value': 'a'})), 'a')
+        self.assertEqual(render(Context({'part': 1, 'value': 'b'})), 'a')
+        self.assertEqual(render(Context({'part': 2, 'value': 'b'})), 'b')
+        versioned = Template(
+            '{% load tiered_cache %}'
+            '{% cache 60 versioned version=v %}{{ value }}{% endcache %}'
+        ).render
+        self.assertEqual(versioned(Context({'v': 1, 'value': 'a'})), 'a')
+        self.assertEqual(versioned(Context({'v': 1, 'value': 'b'})), 'a')
+        self.assertEqual(versioned(Context({'v': 2, 'value': 'b'})), 'b')
+        with self.assertRaises(TemplateSyntaxError):
+            Template(
+                '{% load tiered_cache %}{% cache 60 f using="default" %}'
+                '{% endcache %}'
+            )
@@ -0,0 +1,174 @@
+"""Двухуровневый кеш для дорогих отрисовок с защитой от наплыва.
+
+L1 — словарь процесса с коротким сроком ``TIERED_CACHE_L1_TIMEOUT``,
+L2 — общий кеш ``TIERED_CACHE_ALIAS``. Запись в L2 хранит значение,
+логический срок жизни, время, за которое значение посчиталось, и версию
+данных. Версия не входит в ключ, но значение прошлой версии не отдаётся
+никогда: после её смены один процесс пересчитывает запись, а остальные
+ждут его, как при промахе. Иначе отрисовка со старыми данными попала бы
+в кеш страниц и под новый ETag.
+
+Пересчёт начинается раньше срока с вероятностью, растущей к его концу
+и ко времени пересчёта (XFetch: ``now - delta * beta * ln(rand) >=
+expires``). Считает только тот процесс, который взял блокировку
+``cache.add(key + ':lock')``. Остальные в это время отдают старое
+значение той же версии: в L2 оно живёт ещё ``TIERED_CACHE_GRACE``
+секунд после срока. Если значения нужной версии нет, остальные ждут
+пересчёта до
+``TIERED_CACHE_LOCK_TIMEOUT`` секунд, но не дольше, чем держится
+блокировка: если пересчёт упал, каждый считает сам.
+
+``cache.clear()`` очищает только L2. L1 переживает его не дольше
+своего короткого срока, сбросить его сразу можно через ``clear_local``.
+"""
+import math
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+_stats = Counter()
+
+POLL_INTERVAL = 0.05
+
+
+def _l2():
+    return caches[settings.TIERED_CACHE_ALIAS]
+
+
+def stats():
+    """Счётчики с запуска процесса: попадания в L1 и L2, промахи,
+    пересчёты и отданные старые значения.
+    """
+    with _local_lock:
+        return dict(_stats)
+
+
+def clear_local():
+    with _local_lock:
+        _local.clear()
+        _stats.clear()
+
+
+def _local_get(key, now):
+    with _local_lock:
+        item = _local.get(key)
+        if item is None:
+            return None
+        entry, until = item
+        if until <= now:
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return entry
+
+
+def _local_set(key, entry, now):
+    expires = entry[1]
+    until = now + settings.TIERED_CACHE_L1_TIMEOUT
+    if expires is not None:
+        until = min(until, expires)
+    with _local_lock:
+        _local[key] = (entry, until)
+        _local.move_to_end(key)
+        while len(_local) > settings.TIERED_CACHE_L1_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _count(event):
+    with _local_lock:
+        _stats[event] += 1
+
+
+def should_refresh(expires, delta, now, beta=1.0):
+    """Пора ли пересчитать значение (XFetch)."""
+    if expires is None:
+        return False
+    # ln(rand) < 0, поэтому срок как бы приближается на случайную
+    # величину, пропорциональную времени пересчёта.
+    return now - delta * beta * math.log(1 - random.random()) >= expires
+
+
+def _compute(key, compute, timeout, version):
+    start = time.time()
+    value = compute()
+    now = time.time()
+    delta = now - start
+    expires = None if timeout is None else now + timeout
+    entry = (value, expires, delta, version)
+    l2_timeout = None if timeout is None else (
+        timeout + settings.TIERED_CACHE_GRACE
+    )
+    _l2().set(key, entry, l2_timeout)
+    _local_set(key, entry, now)
+    _count('computed')
+    return value
+
+
+def _acquire(key):
+    return _l2().add(
+        f'{key}:lock', 1, settings.TIERED_CACHE_LOCK_TIMEOUT
+    )
+
+
+def _release(key):
+    _l2().delete(f'{key}:lock')
+
+
+def _wait(key, version):
+    """Ждёт значение версии version, которое считает другой процесс.
+    None, если блокировку сняли без значения или она не снялась за
+    отведённое время.
+    """
+    deadline = time.time() + settings.TIERED_CACHE_LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _l2().get(key)
+        if entry is not None and entry[3] == version:
+            _local_set(key, entry, time.time())
+            return entry
+        if _l2().get(f'{key}:lock') is None:
+            return None
+    return None
+
+
+def get_or_set(key, compute, timeout, beta=None, version=None):
+    """Значение key из L1 или L2. Если его нет, оно другой версии или
+    его пора пересчитать, вызывает compute() не больше чем в одном
+    процессе одновременно.
+    """
+    if beta is None:
+        beta = settings.TIERED_CACHE_BETA
+    now = time.time()
+    entry = _local_get(key, now)
+    if entry is not None:
+        _count('l1_hits')
+    else:
+        entry = _l2().get(key)
+        if entry is not None:
+            _count('l2_hits')
+            _local_set(key, entry, now)
+    if entry is not None and entry[3] == version:
+        value, expires, delta, _ = entry
+        if not should_refresh(expires, delta, now, beta):
+            return value
+        if not _acquire(key):
+            _count('stale')
+            return value
+    else:
+        _count('misses')
+        if not _acquire(key):
+            entry = _wait(key, version)
+            if entry is not None:
+                return entry[0]
+            # Держатель блокировки упал или не успел: считаем сами.
+            return _compute(key, compute, timeout, version)
+    try:
+        return _compute(key, compute, timeout, version)
+    finally:
+        _release(key)
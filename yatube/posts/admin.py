@@ -1,5 +1,90 @@
+from datetime import datetime, time, timedelta
+
 from django.contrib import admin
+from django.db.models import Min, QuerySet
+from django.forms import ChoiceField, ModelChoiceField, Select
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
 from .models import Post, Group
+from .search import get_backend
+from .utils import EstimatedCountPaginator, group_choices
+
+
+def next_period(day, kind):
+    if kind == 'year':
+        return day.replace(year=day.year + 1, month=1, day=1)
+    if kind == 'month':
+        return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+class SeekDatesQuerySet(QuerySet):
+    """QuerySet списка постов в админке.
+
+    ``date_hierarchy`` строит ссылки через ``dates()``, а это DISTINCT
+    по всей таблице. Здесь каждый следующий год, месяц или день ищется
+    запросом ``MIN(created)`` от начала периода, то есть поиском по
+    индексу (created, id). Запросов столько, сколько периодов в ответе.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        queryset = self.order_by()
+        periods = []
+        start = None
+        while True:
+            if start is not None:
+                rest = queryset.filter(**{f'{field_name}__gte': start})
+            else:
+                rest = queryset
+            first = rest.aggregate(first=Min(field_name))['first']
+            if first is None:
+                break
+            day = first.date()
+            if kind == 'year':
+                day = day.replace(month=1, day=1)
+            elif kind == 'month':
+                day = day.replace(day=1)
+            periods.append(day)
+            start = datetime.combine(
+                next_period(day, kind), time.min, tzinfo=first.tzinfo
+            )
+        if order == 'DESC':
+            periods.reverse()
+        return periods
+
+
+class GroupSelect(Select):
+    """Select, который собирает варианты одной строкой, без шаблона
+    на каждый <option>: в списке постов их сотни на странице.
+    """
+
+    def render(self, name, value, attrs=None, renderer=None):
+        selected = '' if value is None else str(value)
+        options = format_html_join('', '<option value="{}"{}>{}</option>', (
+            (key, ' selected' if str(key) == selected else '', label)
+            for key, label in self.choices
+        ))
+        return format_html(
+            '<select name="{}"{}>{}</select>',
+            name, flatatt(self.build_attrs(self.attrs, attrs)), options,
+        )
+
+
+class GroupChoiceField(ModelChoiceField):
+    """Выбор группы по списку из кеша. Поле группы редактируется прямо
+    в списке постов, и без кеша каждая строка выбирала бы все группы
+    заново.
+    """
+
+    widget = GroupSelect
+
+    def _get_choices(self):
+        choices = group_choices()
+        if self.empty_label is not None:
+            choices = [('', self.empty_label)] + choices
+        return choices
+
+    choices = property(_get_choices, ChoiceField._set_choices)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,10 +96,33 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    # Поле нужно, чтобы админка показала строку поиска; сам поиск
+    # идёт по полнотекстовому индексу в get_search_results.
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
+    # Порядок совпадает с индексом (created, id), поэтому сортировка
+    # не требует прохода по всей таблице.
+    ordering = ('-created', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return SeekDatesQuerySet(queryset.model, queryset.query, queryset.db)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['form_class'] = GroupChoiceField
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -3,3 +3,17 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from core import object_cache
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_migrate
+
+        from . import search, signals  # noqa: F401
+        from .models import Group, Post
+
+        post_migrate.connect(search.install_after_migrate, sender=self)
+
+        object_cache.register(Post)
+        object_cache.register(Group, fields=('slug',))
+        object_cache.register(get_user_model(), fields=('username',))
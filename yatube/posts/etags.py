@@ -0,0 +1,70 @@
+"""ETag для условных GET-запросов лент и страницы поста.
+
+Валидатор считается без отрисовки: по версиям из кеша (fragments)
+и, где нужно состояние подписок, коротким запросом по индексу. Если
+ETag совпал с If-None-Match, декоратор ``etag`` отвечает 304 и
+представление не вызывается.
+
+В ETag входят пользователь (шапка и кнопки зависят от него) и курсор
+или номер страницы. Last-Modified не отдаётся: версии не привязаны ко
+времени, а удаление поста или комментария не двигает даты вперёд.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+
+from .fragments import (
+    get_cards_version, get_comment_version, get_feed_version,
+)
+from .models import Follow
+
+
+def make_etag(request, *parts):
+    user = request.user.pk if request.user.is_authenticated else 0
+    page = request.GET.get('cursor') or request.GET.get('page') or ''
+    raw = ':'.join(str(part) for part in (user, page) + parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def index_etag(request):
+    return make_etag(
+        request, 'index', request.GET.get('order'), get_cards_version()
+    )
+
+
+def group_etag(request, slug):
+    return make_etag(request, 'group', slug, get_cards_version())
+
+
+def profile_etag(request, username):
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author__username=username).exists()
+    )
+    return make_etag(
+        request, 'profile', username, following, get_cards_version()
+    )
+
+
+def post_etag(request, post_id):
+    # Правка и удаление любого поста меняют версию ленты, поэтому она
+    # покрывает и сам пост, и счётчик постов автора, без запроса к базе.
+    return make_etag(
+        request, 'post', post_id, get_feed_version(),
+        get_comment_version(post_id),
+    )
+
+
+def follow_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    # Число и наибольший id подписок читаются из индекса unique_follower
+    # и меняются при любой подписке или отписке.
+    follows = Follow.objects.filter(user=request.user).aggregate(
+        count=Count('id'), last=Max('id'),
+    )
+    return make_etag(
+        request, 'follow', follows['count'], follows['last'],
+        get_cards_version(),
+    )
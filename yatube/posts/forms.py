@@ -1,5 +1,10 @@
-from django.forms import ModelForm
-from posts.models import Post, Comment
+from core import object_cache
+from django.core.files.uploadedfile import UploadedFile
+from django.forms import (CharField, ChoiceField, DateField, Form, ModelForm,
+                          ValidationError)
+from posts.models import Group, Post, Comment, User
+
+from . import images
 
 
 class PostForm(ModelForm):
@@ -11,8 +16,63 @@ class PostForm(ModelForm):
         help_texts = {"text": "Обязательное поле!",
                       "group": "Необязательное поле!", }
 
+    def save(self, commit=True):
+        image = self.cleaned_data.get('image')
+        if 'image' in self.changed_data and isinstance(image, UploadedFile):
+            self.instance.image = images.ingest(image)
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+        # Счётчики комментариев меняются сигналами, пока пост
+        # редактируется. Полное сохранение записало бы старые значения.
+        self.instance.save(update_fields=[*self._meta.fields, 'updated'])
+        return self.instance
+
 
 class CommentForm(ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class PostFilterForm(Form):
+    """Фильтры по автору и группе. В cleaned_data попадают сами
+    объекты, найденные через кеш объектов.
+    """
+    author = CharField(label='Автор', max_length=150, required=False)
+    group = CharField(label='Группа', max_length=50, required=False,
+                      help_text='Адрес группы, например cats')
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        try:
+            return object_cache.get(User, username=username)
+        except User.DoesNotExist:
+            raise ValidationError('Автор не найден')
+
+    def clean_group(self):
+        slug = self.cleaned_data['group']
+        if not slug:
+            return None
+        try:
+            return object_cache.get(Group, slug=slug)
+        except Group.DoesNotExist:
+            raise ValidationError('Группа не найдена')
+
+
+class SearchForm(PostFilterForm):
+    q = CharField(label='Поиск', max_length=200)
+
+    field_order = ('q', 'author', 'group')
+
+
+class ExportForm(PostFilterForm):
+    format = ChoiceField(
+        choices=(('ndjson', 'NDJSON'), ('csv', 'CSV')), required=False
+    )
+    since = DateField(label='С даты', required=False)
+    until = DateField(label='По дату', required=False)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'ndjson'
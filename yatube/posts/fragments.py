@@ -0,0 +1,79 @@
+"""Версии данных для ключей кеша и HTTP-валидаторов.
+
+Версия ленты увеличивается при сохранении и удалении любого поста,
+поэтому кеш страниц ленты можно хранить долго: после изменения страницы
+получают новый ключ. Отдельные карточки постов кешируются по паре
+(post.pk, post.updated) и переиспользуются всеми лентами. Версия
+комментариев ведётся для каждого поста отдельно, а версия обсуждений
+меняется при любом комментарии: от неё зависят счётчики на карточках
+и порядок «Обсуждаемых» на главной.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FEED_VERSION_KEY = 'feed_version'
+DISCUSSED_VERSION_KEY = 'discussed_version'
+
+
+def _initial_version():
+    # После вытеснения ключа версия не должна повторить старую.
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+            return cache.get(key)
+    except Exception:
+        # Сбой кеша не должен ронять сохранение поста или комментария:
+        # старые страницы доживут до конца срока своих записей.
+        logger.exception('Не удалось сменить версию %s', key)
+        return None
+
+
+def get_feed_version():
+    return get_version(FEED_VERSION_KEY)
+
+
+def bump_feed_version():
+    return bump_version(FEED_VERSION_KEY)
+
+
+def get_discussed_version():
+    return get_version(DISCUSSED_VERSION_KEY)
+
+
+def bump_discussed_version():
+    return bump_version(DISCUSSED_VERSION_KEY)
+
+
+def get_cards_version():
+    """Версия карточек в лентах: меняется и с лентой, и с комментариями."""
+    return f'{get_feed_version()}.{get_discussed_version()}'
+
+
+def comment_version_key(post_id):
+    return f'comment_version:{post_id}'
+
+
+def get_comment_version(post_id):
+    return get_version(comment_version_key(post_id))
+
+
+def bump_comment_version(post_id):
+    return bump_version(comment_version_key(post_id))
@@ -0,0 +1,90 @@
+"""Подготовка загруженных картинок постов перед сохранением.
+
+Оригинал с камеры весит десятки мегабайт, и каждая миниатюра
+декодирует его целиком. Поэтому при сохранении формы картинка
+уменьшается до ``IMAGE_MAX_SIZE`` по большей стороне, поворачивается
+по EXIF и перекодируется в ``IMAGE_FORMAT`` без метаданных. Файл
+называется по хешу содержимого загрузки: одинаковые загрузки дают
+один файл на диске, и повторно картинка не обрабатывается.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .models import Post
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+}
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        'transparency' in image.info
+    )
+
+
+def output_format(image):
+    """Формат из настроек. Если Pillow собран без WebP, фото
+    сохраняются в JPEG, а картинки с прозрачностью — в PNG.
+    """
+    if settings.IMAGE_FORMAT == 'WEBP' and not features.check('webp'):
+        return 'PNG' if has_alpha(image) else 'JPEG'
+    return settings.IMAGE_FORMAT
+
+
+def content_hash(upload):
+    # Настройки входят в хеш, чтобы после их смены та же загрузка
+    # не подхватила файл, обработанный по-старому.
+    digest = hashlib.sha256('{}:{}:{}:'.format(
+        settings.IMAGE_MAX_SIZE, settings.IMAGE_QUALITY,
+        settings.IMAGE_FORMAT,
+    ).encode())
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode(image, image_format):
+    size = settings.IMAGE_MAX_SIZE
+    # JPEG декодируется сразу в уменьшенном масштабе: быстрее
+    # и без полного буфера пикселей оригинала.
+    image.draft('RGB', (size, size))
+    image = ImageOps.exif_transpose(image)
+    mode = 'RGBA' if has_alpha(image) and image_format != 'JPEG' else 'RGB'
+    image = image.convert(mode)
+    image.thumbnail((size, size), Image.LANCZOS)
+    options = {'quality': settings.IMAGE_QUALITY}
+    if image_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    elif image_format == 'PNG':
+        options = {'optimize': True}
+    # Ни exif, ни другие метаданные в save() не передаются, поэтому
+    # в файл они не попадают. Цветовой профиль сохраняется.
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def ingest(upload):
+    """Сохраняет загруженную картинку и возвращает имя файла
+    в хранилище поля Post.image.
+    """
+    storage = Post._meta.get_field('image').storage
+    digest = content_hash(upload)
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = output_format(image)
+        name = f'posts/{digest}.{EXTENSIONS[image_format]}'
+        if storage.exists(name):
+            return name
+        content = encode(image, image_format)
+    return storage.save(name, ContentFile(content))
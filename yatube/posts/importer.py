@@ -0,0 +1,249 @@
+"""Пакетный импорт постов, комментариев и подписок из NDJSON.
+
+Каждая строка файла — объект с полем ``type``: ``post``, ``comment``
+или ``follow`` (без поля — тип по умолчанию). Посты и комментарии
+в том же виде, что отдаёт выгрузка ``export``::
+
+    {"id": 1, "created": "...", "author": "leo", "group": "cats",
+     "text": "...", "image": ""}
+    {"type": "comment", "post": 1, "author": "kate", "text": "..."}
+    {"type": "follow", "user": "kate", "author": "leo"}
+
+Авторы и группы ищутся в словарях username -> id и slug -> id,
+загруженных один раз. Неизвестные создаются пачкой. Строки пишутся
+через ``bulk_create`` пачками, каждая пачка в своей транзакции вместе
+с отметкой ImportCheckpoint, поэтому прерванный импорт продолжается
+с места остановки. Повторные подписки отбрасывает сама база
+(``ignore_conflicts``), без проверки по одной строке.
+"""
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, ImportCheckpoint, Post, User
+from .utils import GROUP_CHOICES_KEY, keep_created
+
+TYPES = ('post', 'comment', 'follow')
+REQUIRED = {
+    'post': ('author', 'text'),
+    'comment': ('post', 'author', 'text'),
+    'follow': ('user', 'author'),
+}
+# Ограничение SQLite на число параметров запроса.
+IN_CHUNK = 900
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def parse_created(value):
+    if not value:
+        return timezone.now()
+    created = parse_datetime(value)
+    if created is None:
+        raise InvalidRecord('неверная дата')
+    if timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    return created
+
+
+def existing(model, field, values):
+    """Словарь {значение field: pk} для values, которые есть в базе."""
+    values = list(values)
+    found = {}
+    for start in range(0, len(values), IN_CHUNK):
+        chunk = values[start:start + IN_CHUNK]
+        found.update(model.objects.filter(
+            **{f'{field}__in': chunk}).values_list(field, 'pk'))
+    return found
+
+
+class Importer:
+    def __init__(self, batch_size=5000, default_type='post', report=None):
+        self.batch_size = batch_size
+        self.default_type = default_type
+        self.report = report
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.password = make_password(None)
+        self.counts = Counter()
+        self.started = None
+
+    def parse(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise InvalidRecord(error)
+        if not isinstance(record, dict):
+            raise InvalidRecord('ожидался объект')
+        kind = record.setdefault('type', self.default_type)
+        if kind not in TYPES:
+            raise InvalidRecord(f'неизвестный тип {kind}')
+        for key in REQUIRED[kind]:
+            if not record.get(key):
+                raise InvalidRecord(f'нет поля {key}')
+        if kind != 'follow':
+            record['created'] = parse_created(record.get('created'))
+        return record
+
+    def run(self, path, resume=False):
+        """Импорт файла path. С resume чтение продолжается с отметки
+        прошлого запуска.
+        """
+        source = os.path.abspath(path)
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+        if not resume:
+            checkpoint.offset = checkpoint.lines = 0
+        self.started = time.monotonic()
+        offset = checkpoint.offset
+        batch = []
+        with open(source, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                offset += len(line)
+                if line.strip():
+                    batch.append(line)
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, checkpoint, offset)
+                    batch = []
+        if batch or offset != checkpoint.offset:
+            self.flush(batch, checkpoint, offset)
+        self.finish()
+        return self.counts
+
+    def flush(self, lines, checkpoint, offset):
+        records = defaultdict(list)
+        for line in lines:
+            try:
+                record = self.parse(line)
+            except InvalidRecord:
+                self.counts['invalid'] += 1
+                continue
+            records[record['type']].append(record)
+        # При ошибке транзакция откатится, а словари авторов и групп
+        # останутся с несохранёнными id. Импорт при этом прерывается,
+        # и повторный запуск загрузит словари заново.
+        with transaction.atomic(), keep_created(Post, Comment):
+            self.create_authors(records)
+            self.create_groups(records['post'])
+            self.save_posts(records['post'])
+            self.save_comments(records['comment'])
+            self.save_follows(records['follow'])
+            checkpoint.offset = offset
+            checkpoint.lines += len(lines)
+            checkpoint.save()
+        self.counts['lines'] += len(lines)
+        if self.report is not None:
+            self.report(self.counts, self.rate())
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.counts['lines'] / elapsed if elapsed else 0
+
+    def create_authors(self, records):
+        usernames = {record['author'] for rows in records.values()
+                     for record in rows}
+        usernames.update(record['user'] for record in records['follow'])
+        missing = usernames - self.users.keys()
+        if not missing:
+            return
+        User.objects.bulk_create(
+            User(username=username, password=self.password)
+            for username in missing
+        )
+        self.users.update(existing(User, 'username', missing))
+        self.counts['users'] += len(missing)
+
+    def create_groups(self, posts):
+        missing = {
+            record['group'] for record in posts if record.get('group')
+        } - self.groups.keys()
+        if not missing:
+            return
+        Group.objects.bulk_create(
+            Group(title=slug, slug=slug, description='') for slug in missing
+        )
+        self.groups.update(existing(Group, 'slug', missing))
+        self.counts['groups'] += len(missing)
+
+    def skip_existing_ids(self, model, records):
+        """Записи без id или с id, которого ещё нет в базе."""
+        ids = {record['id'] for record in records if record.get('id')}
+        taken = existing(model, 'pk', ids) if ids else {}
+        fresh = []
+        for record in records:
+            pk = record.get('id')
+            if pk:
+                if pk in taken:
+                    self.counts['duplicates'] += 1
+                    continue
+                taken[pk] = None
+            fresh.append(record)
+        return fresh
+
+    def save_posts(self, records):
+        posts = [
+            Post(
+                id=record.get('id'),
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                text=record['text'],
+                image=record.get('image') or '',
+                created=record['created'],
+            )
+            for record in self.skip_existing_ids(Post, records)
+        ]
+        Post.objects.bulk_create(posts)
+        self.counts['posts'] += len(posts)
+
+    def save_comments(self, records):
+        records = self.skip_existing_ids(Comment, records)
+        posts = existing(Post, 'pk', {record['post'] for record in records})
+        comments = []
+        for record in records:
+            if record['post'] not in posts:
+                self.counts['missing_post'] += 1
+                continue
+            comments.append(Comment(
+                id=record.get('id'),
+                post_id=record['post'],
+                author_id=self.users[record['author']],
+                text=record['text'],
+                created=record['created'],
+            ))
+        Comment.objects.bulk_create(comments)
+        self.counts['comments'] += len(comments)
+
+    def save_follows(self, records):
+        pairs = {
+            (self.users[record['user']], self.users[record['author']])
+            for record in records
+        }
+        follows = [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs if user_id != author_id
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.counts['follows'] += len(follows)
+
+    def finish(self):
+        """Сдвигает последовательности id после вставки с явными id
+        (нужно Postgres) и сбрасывает кеш списка групп.
+        """
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment]
+        )
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        cache.delete(GROUP_CHOICES_KEY)
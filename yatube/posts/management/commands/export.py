@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORTS, FORMATS, stream
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка постов или комментариев в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORTS)
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--author', help='Имя пользователя автора')
+        parser.add_argument('--group', help='Адрес группы')
+        parser.add_argument('--since', type=date.fromisoformat)
+        parser.add_argument('--until', type=date.fromisoformat)
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument(
+            '--output', help='Файл для выгрузки, по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = (
+                User.objects.get(username=options['author'])
+                if options['author'] else None
+            )
+            group = (
+                Group.objects.get(slug=options['group'])
+                if options['group'] else None
+            )
+        except (User.DoesNotExist, Group.DoesNotExist) as error:
+            raise CommandError(error)
+        lines = stream(
+            options['kind'], options['format'],
+            author=author, group=group,
+            since=options['since'], until=options['until'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output']:
+            with open(
+                options['output'], 'w', encoding='utf-8', newline='',
+            ) as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,28 @@
+from concurrent.futures import wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры для картинок постов'
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct().order_by()
+        jobs = []
+        for name in images.iterator():
+            ready = all(
+                thumbnails.get_ready_thumbnail(name, preset)
+                for preset in settings.THUMBNAIL_PRESETS
+            )
+            if not ready:
+                jobs.append(thumbnails.enqueue(name))
+        wait([job for job in jobs if job is not None])
+        self.stdout.write(
+            self.style.SUCCESS(f'Поставлено в очередь картинок: {len(jobs)}')
+        )
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.fragments import bump_feed_version
+from posts.importer import TYPES, Importer
+from posts.timeline import rebuild_timelines
+from posts.utils import rebuild_author_stats, rebuild_comment_counts
+
+
+class Command(BaseCommand):
+    help = 'Импорт постов, комментариев и подписок из файла NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--type', choices=TYPES, default='post',
+            help='Тип строк без поля type',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, где остановился прошлый запуск',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики и ленты подписок',
+        )
+
+    def report(self, counts, rate):
+        self.stdout.write(
+            f'строк {counts["lines"]}: постов {counts["posts"]}, '
+            f'комментариев {counts["comments"]}, '
+            f'подписок {counts["follows"]}, '
+            f'пропущено {self.skipped(counts)} | {rate:.0f} строк/с'
+        )
+
+    def skipped(self, counts):
+        return (
+            counts['invalid'] + counts['duplicates'] + counts['missing_post']
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options['batch_size'],
+            default_type=options['type'],
+            report=self.report,
+        )
+        start = time.monotonic()
+        try:
+            counts = importer.run(options['path'], resume=options['resume'])
+        except OSError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f'Импорт завершён за {time.monotonic() - start:.1f} с: '
+            f'новых авторов {counts["users"]}, групп {counts["groups"]}; '
+            f'с ошибками {counts["invalid"]}, повторов '
+            f'{counts["duplicates"]}, без поста {counts["missing_post"]}'
+        )
+        # bulk_create не вызывает сигналы, поэтому производные данные
+        # пересчитываются целиком.
+        if not options['skip_rebuild']:
+            rebuild_author_stats()
+            rebuild_comment_counts()
+            rebuild_timelines()
+        bump_feed_version()
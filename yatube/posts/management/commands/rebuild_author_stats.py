@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.utils import rebuild_author_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписчиков авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_author_stats(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано счётчиков: {rebuilt}')
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.fragments import bump_feed_version
+from posts.utils import rebuild_comment_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число и дату последнего комментария постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_comment_counts(batch_size=options['batch_size'])
+        bump_feed_version()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано постов: {rebuilt}')
+        )
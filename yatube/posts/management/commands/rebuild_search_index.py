@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.install(connection)
+        backend.rebuild(connection)
+        self.stdout.write(f'Индекс перестроен: {type(backend).__name__}')
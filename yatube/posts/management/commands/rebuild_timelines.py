@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет ленты подписок по текущим подпискам'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_timelines()
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано подписок: {rebuilt}')
+        )
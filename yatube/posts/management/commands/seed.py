@@ -0,0 +1,202 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import rebuild_timelines
+from posts.utils import (keep_created, rebuild_author_stats,
+                         rebuild_comment_counts)
+
+TEXT_POOL_SIZE = 2000
+
+
+def zipf_weights(n, exponent):
+    """Накопленные веса 1 / rank^exponent: немного «тяжёлых» элементов
+    и длинный хвост.
+    """
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--author-exponent', type=float, default=1.1,
+            help='Показатель Ципфа для распределения постов по авторам',
+        )
+        parser.add_argument(
+            '--followee-exponent', type=float, default=1.2,
+            help='Показатель Ципфа для распределения подписчиков',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты постов',
+        )
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Не заполнять ленты подписок после загрузки',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.texts = [
+            self.fake.sentence(nb_words=12) for _ in range(TEXT_POOL_SIZE)
+        ]
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+
+        self.stage('users', self.create_users, options['users'])
+        self.stage('groups', self.create_groups, options['groups'])
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        self.stage(
+            'posts', self.create_posts, options['posts'],
+            user_ids, group_ids, options['author_exponent'],
+        )
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        self.stage(
+            'comments', self.create_comments, options['comments'],
+            user_ids, post_ids, options['author_exponent'],
+        )
+        self.stage(
+            'follows', self.create_follows, options['follows'],
+            user_ids, options['followee_exponent'],
+        )
+        self.stage('author stats', rebuild_author_stats)
+        self.stage('comment counts', rebuild_comment_counts)
+        if not options['skip_timelines']:
+            self.stage('timelines', rebuild_timelines)
+
+    def stage(self, name, func, *args):
+        start = time.monotonic()
+        with transaction.atomic():
+            func(*args)
+        self.stdout.write(f'{name}: {time.monotonic() - start:.1f} с')
+
+    def bulk_create(self, model, objects, **kwargs):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch, **kwargs)
+                batch = []
+        model.objects.bulk_create(batch, **kwargs)
+
+    def text(self, sentences):
+        return ' '.join(self.random.choices(self.texts, k=sentences))
+
+    def ranked(self, ids):
+        """Случайный порядок ids: кому достанутся «тяжёлые» веса."""
+        ranked = list(ids)
+        self.random.shuffle(ranked)
+        return ranked
+
+    def created(self):
+        return self.now - timedelta(seconds=self.random.random() * self.span)
+
+    def create_users(self, count):
+        password = make_password(None)
+        offset = User.objects.count()
+        names = [self.fake.user_name() for _ in range(TEXT_POOL_SIZE)]
+        first_names = [
+            self.fake.first_name() for _ in range(TEXT_POOL_SIZE)
+        ]
+        last_names = [self.fake.last_name() for _ in range(TEXT_POOL_SIZE)]
+        self.bulk_create(User, (
+            User(
+                username=f'{self.random.choice(names)}_{offset + i}',
+                first_name=self.random.choice(first_names),
+                last_name=self.random.choice(last_names),
+                password=password,
+            )
+            for i in range(count)
+        ))
+
+    def create_groups(self, count):
+        offset = Group.objects.count()
+        self.bulk_create(Group, (
+            Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'group-{offset + i}',
+                description=self.text(2),
+            )
+            for i in range(count)
+        ))
+
+    def create_posts(self, count, user_ids, group_ids, exponent):
+        authors = self.random.choices(
+            self.ranked(user_ids),
+            cum_weights=zipf_weights(len(user_ids), exponent),
+            k=count,
+        )
+        group_weights = zipf_weights(len(group_ids), 1.0) if group_ids else []
+        with keep_created(Post):
+            self.bulk_create(Post, (
+                Post(
+                    author_id=author_id,
+                    group_id=(
+                        self.random.choices(
+                            group_ids, cum_weights=group_weights)[0]
+                        if group_ids and self.random.random() < 0.7
+                        else None
+                    ),
+                    text=self.text(self.random.randint(1, 6)),
+                    created=self.created(),
+                )
+                for author_id in authors
+            ))
+
+    def create_comments(self, count, user_ids, post_ids, exponent):
+        if not post_ids:
+            return
+        posts = self.random.choices(
+            self.ranked(post_ids),
+            cum_weights=zipf_weights(len(post_ids), exponent),
+            k=count,
+        )
+        with keep_created(Comment):
+            self.bulk_create(Comment, (
+                Comment(
+                    post_id=post_id,
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(1),
+                    created=self.created(),
+                )
+                for post_id in posts
+            ))
+
+    def create_follows(self, count, user_ids, exponent):
+        if len(user_ids) < 2:
+            return
+        followees = self.random.choices(
+            self.ranked(user_ids),
+            cum_weights=zipf_weights(len(user_ids), exponent),
+            k=count,
+        )
+        # Повторы и подписки на себя отбрасываются, поэтому подписок
+        # может получиться немного меньше, чем count.
+        self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in zip(
+                (self.random.choice(user_ids) for _ in followees), followees,
+            )
+            if user_id != author_id
+        ), ignore_conflicts=True)
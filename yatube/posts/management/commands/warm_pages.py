@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from posts import page_cache
+from posts.models import Group, Post
+
+
+class Command(BaseCommand):
+    help = 'Отрисовывает в кеш гостей первые страницы главной и всех групп'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=settings.PAGE_CACHE_WARM_PAGES,
+        )
+
+    def handle(self, *args, **options):
+        if not settings.PAGE_CACHE_ENABLED:
+            raise CommandError('Кеш страниц выключен: PAGE_CACHE_ENABLED')
+        pages = options['pages']
+        page_cache.warm_feed(reverse('posts:index'), Post.objects.all(), pages)
+        groups = Group.objects.values_list('pk', 'slug')
+        for group_id, slug in groups.iterator():
+            page_cache.warm_feed(
+                reverse('posts:group_list', args=(slug,)),
+                Post.objects.filter(group_id=group_id), pages,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогреты главная и групп: {groups.count()}'
+        ))
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from posts.search import get_backend
+
+    connection = schema_editor.connection
+    get_backend(connection.alias).install(connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from posts.search import get_backend
+
+    connection = schema_editor.connection
+    get_backend(connection.alias).uninstall(connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True, verbose_name='Файл')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Смещение в байтах')),
+                ('lines', models.PositiveIntegerField(default=0, verbose_name='Прочитано строк')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+        ),
+    ]
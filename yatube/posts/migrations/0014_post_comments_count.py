@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:29
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comment_counts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    Post.objects.update(
+        comments_count=Coalesce(Subquery(
+            comments.values('post').annotate(total=Count('id'))
+            .values('total')
+        ), 0),
+        last_commented_at=Subquery(
+            comments.values('post').annotate(last=Max('created'))
+            .values('last')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_commented_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['comments_count', 'id'], name='post_discussed_idx'),
+        ),
+        migrations.RunPython(fill_comment_counts, migrations.RunPython.noop),
+    ]
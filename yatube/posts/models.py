@@ -41,8 +41,39 @@ class Post(CreatedModel):
         blank=True
     )
 
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+
+    # Счётчики комментариев ведут сигналы, формы их не меняют.
+    comments_count = models.PositiveIntegerField(
+        'Комментариев', default=0, editable=False
+    )
+    last_commented_at = models.DateTimeField(
+        'Последний комментарий', null=True, blank=True, editable=False
+    )
+
     class Meta:
         ordering = ['created']
+        indexes = (
+            models.Index(
+                fields=['created', 'id'],
+                name='post_created_idx',
+            ),
+            models.Index(
+                fields=['author', 'created', 'id'],
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=['group', 'created', 'id'],
+                name='post_group_created_idx',
+            ),
+            models.Index(
+                fields=['comments_count', 'id'],
+                name='post_discussed_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -59,6 +90,14 @@ class Comment(CreatedModel):
         related_name='comments')
     text = models.TextField('Текст', help_text='Текст нового комментария')
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -77,3 +116,64 @@ class Follow(models.Model):
             fields=['user', 'author'],
             name='unique_follower',
         ),)
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые дорого считать при каждом запросе."""
+    author = models.OneToOneField(
+        User,
+        verbose_name='Автор',
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='post_stats',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя. Записи создаются при публикации
+    поста (fan-out-on-write), чтобы лента читалась по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=['user', 'post'],
+            name='unique_timeline_entry',
+        ),)
+        indexes = (
+            models.Index(
+                fields=['user', 'created', 'post'],
+                name='timeline_user_created_idx',
+            ),
+        )
+
+
+class ImportCheckpoint(models.Model):
+    """Докуда прочитан файл импорта. Сохраняется в той же транзакции,
+    что и пачка строк, поэтому после сбоя импорт продолжается без
+    повторов и пропусков.
+    """
+    source = models.CharField('Файл', max_length=500, unique=True)
+    offset = models.BigIntegerField('Смещение в байтах', default=0)
+    lines = models.PositiveIntegerField('Прочитано строк', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
@@ -0,0 +1,189 @@
+"""Кеш целых страниц лент для гостей.
+
+Страница гостя не зависит от пользователя, поэтому её HTML хранится
+в кеше под ключом из версий ленты и обсуждений, адреса и параметров
+``page``, ``cursor`` и ``order``. Запросы с cookie сессии или сообщений могут
+быть от вошедшего пользователя и идут мимо кеша, не загружая сессию.
+Запросы с другими параметрами тоже не кешируются, чтобы случайные
+адреса не вытесняли нужные страницы.
+
+После сохранения поста версия ленты меняется, и первые
+``PAGE_CACHE_WARM_PAGES`` страниц главной и группы поста
+отрисовываются заново в фоновом потоке после коммита (``enqueue``),
+не задерживая запрос, сохранивший пост. Команда ``warm_pages`` делает
+то же для всех групп сразу, например после деплоя.
+
+Кеш включает ``PAGE_CACHE_ENABLED``. По умолчанию он выключен при
+DEBUG: правки шаблонов видны сразу, а тестовый клиент получает
+контекст шаблона в каждом ответе.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from urllib.parse import urlencode
+
+from core import db_router
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.urls import resolve, reverse
+from django.utils.cache import patch_vary_headers
+
+from .fragments import get_cards_version
+from .models import Group, Post
+from .utils import CursorPaginator
+
+logger = logging.getLogger(__name__)
+
+CACHED_PARAMS = frozenset(('page', 'cursor', 'order'))
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def is_cacheable(request):
+    if not settings.PAGE_CACHE_ENABLED:
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    return set(request.GET) <= CACHED_PARAMS
+
+
+def make_key(request):
+    query = urlencode(sorted(request.GET.items()))
+    raw = f'{request.path}?{query}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'page:{get_cards_version()}:{digest}'
+
+
+def anonymous_page_cache(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not is_cacheable(request):
+            return view(request, *args, **kwargs)
+        key = make_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(
+                    key, (response.content, response['Content-Type']),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+        # Без cookie сессии ответ один для всех, с ней — другой.
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
+def cursors(queryset, pages):
+    """Курсоры первых pages страниц: None для первой, дальше по
+    порядку, пока страницы не кончатся.
+    """
+    paginator = CursorPaginator(
+        queryset.only('created', 'id'), settings.NUMBER_OBJECTS
+    )
+    paginator.first_page()
+    yield None
+    for _ in range(pages - 1):
+        if not paginator.has_next:
+            return
+        token = paginator.next_cursor
+        yield token
+        paginator.get_cursor_page(token)
+
+
+def make_request(path, params):
+    """GET-запрос гостя к path, собранный без обработчика WSGI."""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = QueryDict(mutable=True)
+    request.GET.update(params)
+    request.META = {
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': request.GET.urlencode(),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+    }
+    request.user = AnonymousUser()
+    return request
+
+
+def render_anonymous(path, cursor):
+    request = make_request(path, {'cursor': cursor} if cursor else {})
+    request.resolver_match = resolve(path)
+    return request.resolver_match.func(
+        request, *request.resolver_match.args,
+        **request.resolver_match.kwargs,
+    )
+
+
+def warm_feed(path, queryset, pages):
+    for cursor in cursors(queryset, pages):
+        render_anonymous(path, cursor)
+
+
+def warm(group_id=None, pages=None):
+    """Отрисовывает в кеш первые страницы главной и ленты группы."""
+    if not settings.PAGE_CACHE_ENABLED:
+        return
+    pages = pages or settings.PAGE_CACHE_WARM_PAGES
+    warm_feed(reverse('posts:index'), Post.objects.all(), pages)
+    if group_id is None:
+        return
+    slug = Group.objects.filter(pk=group_id).values_list(
+        'slug', flat=True).first()
+    if slug is not None:
+        warm_feed(
+            reverse('posts:group_list', args=(slug,)),
+            Post.objects.filter(group_id=group_id), pages,
+        )
+
+
+def _work(group_id):
+    try:
+        with db_router.primary():
+            warm(group_id)
+    except Exception:
+        logger.exception('Не удалось прогреть страницы лент')
+    finally:
+        with _lock:
+            _pending.discard(group_id)
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Один поток: прогревы идут друг за другом и не занимают
+            # соединения с базой, нужные запросам.
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='page-cache',
+            )
+        return _executor
+
+
+def enqueue(group_id=None):
+    """Ставит прогрев в очередь, если такой же ещё не ждёт."""
+    if not settings.PAGE_CACHE_ENABLED:
+        return None
+    with _lock:
+        if group_id in _pending:
+            return None
+        _pending.add(group_id)
+    return get_executor().submit(_work, group_id)
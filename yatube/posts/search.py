@@ -0,0 +1,236 @@
+"""Полнотекстовый поиск по тексту постов.
+
+SQLite: внешняя FTS5-таблица над ``posts_post``. Её держат в актуальном
+состоянии триггеры на вставку, изменение и удаление, поэтому индекс
+обновляется и при ``bulk_create`` и при загрузке данных командами.
+Postgres: GIN-индекс по ``to_tsvector('russian', text)``, его база
+обновляет сама. Если FTS5 в сборке SQLite нет, поиск идёт через LIKE.
+
+У всех движков релевантность ``rank`` устроена одинаково: чем меньше,
+тем лучше. Поэтому выдача листается по ключу (rank, id).
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .utils import CursorPaginator, paginate
+
+WORD_RE = re.compile(r'\w+')
+
+
+def split_words(query):
+    return WORD_RE.findall(query)
+
+
+class LikeBackend:
+    """Запасной поиск: все слова запроса через LIKE, без ранжирования."""
+
+    def install(self, connection):
+        pass
+
+    def uninstall(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def filter(self, queryset, query):
+        words = split_words(query)
+        if not words:
+            return queryset.none()
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+
+    def search(self, queryset, query):
+        return self.filter(queryset, query).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class SQLiteBackend(LikeBackend):
+    table = f'{Post._meta.db_table}_fts'
+    source = Post._meta.db_table
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            created = self.table not in connection.introspection.table_names(
+                cursor
+            )
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                f"USING fts5(text, content='{self.source}', "
+                f"content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            # Django пересоздаёт таблицу при изменении схемы в SQLite,
+            # вместе со старой таблицей пропадают и триггеры, поэтому
+            # install вызывается и после каждого migrate.
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_insert '
+                f'AFTER INSERT ON {self.source} BEGIN '
+                f'INSERT INTO {self.table}(rowid, text) '
+                f'VALUES (new.id, new.text); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_delete '
+                f'AFTER DELETE ON {self.source} BEGIN '
+                f"INSERT INTO {self.table}({self.table}, rowid, text) "
+                f"VALUES ('delete', old.id, old.text); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_update '
+                f'AFTER UPDATE OF text ON {self.source} BEGIN '
+                f"INSERT INTO {self.table}({self.table}, rowid, text) "
+                f"VALUES ('delete', old.id, old.text); "
+                f'INSERT INTO {self.table}(rowid, text) '
+                f'VALUES (new.id, new.text); END'
+            )
+        if created:
+            self.rebuild(connection)
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for suffix in ('insert', 'delete', 'update'):
+                cursor.execute(
+                    f'DROP TRIGGER IF EXISTS {self.table}_{suffix}'
+                )
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')"
+            )
+
+    def match(self, words):
+        """Каждое слово в кавычках: синтаксис FTS5 в запросе
+        пользователя не разбирается.
+        """
+        return ' '.join('"{}"'.format(word.replace('"', '""'))
+                        for word in words)
+
+    def _join(self, queryset, query):
+        words = split_words(query)
+        if not words:
+            return None
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = {self.source}.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[self.match(words)],
+        )
+
+    def filter(self, queryset, query):
+        joined = self._join(queryset, query)
+        return queryset.none() if joined is None else joined
+
+    def search(self, queryset, query):
+        joined = self._join(queryset, query)
+        if joined is None:
+            return super().search(queryset.none(), query)
+        # Скрытый столбец rank FTS5 — bm25(), у лучших совпадений
+        # он меньше.
+        return joined.annotate(rank=RawSQL(
+            f'{self.table}.rank', (), output_field=FloatField()
+        ))
+
+
+class PostgresBackend(LikeBackend):
+    config = 'russian'
+    index = f'{Post._meta.db_table}_text_fts_idx'
+    source = Post._meta.db_table
+
+    @property
+    def vector(self):
+        return f"to_tsvector('{self.config}', {self.source}.text)"
+
+    @property
+    def tsquery(self):
+        return f"plainto_tsquery('{self.config}', %s)"
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.index} ON {self.source} '
+                f"USING GIN (to_tsvector('{self.config}', text))"
+            )
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index}')
+
+    def filter(self, queryset, query):
+        if not split_words(query):
+            return queryset.none()
+        return queryset.extra(
+            where=[f'{self.vector} @@ {self.tsquery}'], params=[query],
+        )
+
+    def search(self, queryset, query):
+        return self.filter(queryset, query).annotate(rank=RawSQL(
+            f'-ts_rank({self.vector}, {self.tsquery})', (query,),
+            output_field=FloatField(),
+        ))
+
+
+def has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+_backends = {}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    """Движок поиска по типу базы using."""
+    if using not in _backends:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            _backends[using] = PostgresBackend()
+        elif connection.vendor == 'sqlite' and has_fts5(connection):
+            _backends[using] = SQLiteBackend()
+        else:
+            _backends[using] = LikeBackend()
+    return _backends[using]
+
+
+def install_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if Post._meta.db_table in tables:
+        get_backend(using).install(connection)
+
+
+class SearchPaginator(CursorPaginator):
+    """Выдача поиска по ключу (rank, id)."""
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page, keys=('rank', 'id'))
+
+    def dump_key(self, obj, key):
+        if key == 'rank':
+            return repr(obj.rank)
+        return super().dump_key(obj, key)
+
+    def load_key(self, key, value):
+        if key == 'rank':
+            return float(value)
+        return super().load_key(key, value)
+
+
+def get_search_page(request, query, author=None, group=None, per_page=10):
+    posts = Post.objects.select_related('author', 'group')
+    if author is not None:
+        posts = posts.filter(author=author)
+    if group is not None:
+        posts = posts.filter(group=group)
+    found = get_backend().search(posts, query)
+    return paginate(request, SearchPaginator(found, per_page))
@@ -0,0 +1,117 @@
+from core import object_cache
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import page_cache, timeline
+from .fragments import (
+    bump_comment_version, bump_discussed_version, bump_feed_version,
+)
+from .models import AuthorStats, Comment, Follow, Group, Post
+from .utils import GROUP_CHOICES_KEY, author_stats_defaults
+
+
+def increment(author_id, field):
+    """Увеличивает счётчик автора и возвращает строку счётчиков."""
+    updated = AuthorStats.objects.filter(author_id=author_id).update(
+        **{field: F(field) + 1}
+    )
+    if not updated:
+        AuthorStats.objects.get_or_create(
+            author_id=author_id, defaults=author_stats_defaults(author_id),
+        )
+    return AuthorStats.objects.get(author_id=author_id)
+
+
+def decrement(author_id, field):
+    # Строку счётчиков здесь не создаём: при каскадном удалении автора
+    # она уже удалена, а недостающие счётчики посчитает get_author_stats.
+    AuthorStats.objects.filter(
+        author_id=author_id, **{f'{field}__gt': 0},
+    ).update(**{field: F(field) - 1})
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    bump_feed_version()
+    if raw:
+        return
+    transaction.on_commit(lambda: page_cache.enqueue(instance.group_id))
+    if not created:
+        return
+    stats = increment(instance.author_id, 'posts_count')
+    timeline.fan_out_post(instance, stats.followers_count)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_feed_version()
+    decrement(instance.author_id, 'posts_count')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    stats = increment(instance.author_id, 'followers_count')
+    timeline.backfill(
+        instance.user_id, instance.author_id, stats.followers_count
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    decrement(instance.author_id, 'followers_count')
+    timeline.prune(instance.user_id, instance.author_id)
+    stats = AuthorStats.objects.filter(author_id=instance.author_id).first()
+    if stats is not None:
+        timeline.schedule_catch_up(instance.author_id, stats.followers_count)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    cache.delete(GROUP_CHOICES_KEY)
+    # Название и описание группы выводятся на странице её ленты.
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1,
+            last_commented_at=Case(
+                When(last_commented_at__gte=instance.created,
+                     then=F('last_commented_at')),
+                default=instance.created,
+            ),
+        )
+    comment_changed(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    remaining = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=Case(
+            When(comments_count__gt=0, then=F('comments_count') - 1),
+            default=0,
+        ),
+        last_commented_at=Subquery(
+            remaining.values('post').annotate(last=Max('created'))
+            .values('last')
+        ),
+    )
+    comment_changed(instance)
+
+
+def comment_changed(comment):
+    object_cache.invalidate(Post(pk=comment.post_id))
+    bump_comment_version(comment.post_id)
+    # Счётчики на карточках и порядок «Обсуждаемых» меняют ленты, но не
+    # страницы других постов: версию лент, от которой зависят и они, не
+    # трогаем.
+    bump_discussed_version()
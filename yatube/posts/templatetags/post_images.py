@@ -0,0 +1,11 @@
+from django import template
+
+from posts.thumbnails import get_ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, preset):
+    """Готовая миниатюра или None, пока она создаётся в фоне."""
+    return get_ready_thumbnail(image, preset)
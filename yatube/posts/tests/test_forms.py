@@ -1,11 +1,17 @@
+import os
+import shutil
 import string
+import tempfile
 from http import HTTPStatus
+from io import BytesIO
 import random
 
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from .. import images
 from ..forms import PostForm
 from ..models import Group, Post, User, Comment
 
@@ -68,7 +74,7 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(Post.objects.count(), count + 1)
         self.assertEqual(new_post.text, form_data['text'])
         self.assertEqual(new_post.group.pk, form_data['group'])
-        self.assertEqual(new_post.image.name, f'posts/{name_f}')
+        self.assertRegex(new_post.image.name, r'^posts/[0-9a-f]{64}\.\w+$')
 
     def test_author_edit_post(self):
         """Валидная форма изменяет запись в Posts."""
@@ -127,3 +133,54 @@ class PostCreateFormTests(TestCase):
             response,
             ('/auth/login/?next=/posts/1/comment/'),
         )
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIZE=100)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def photo(name='photo.jpg', color='red'):
+        """JPEG 400x200 с EXIF: описанием и поворотом на 90 градусов."""
+        exif = Image.Exif()
+        exif[0x010e] = 'Описание с камеры'
+        exif[0x0112] = 6
+        output = BytesIO()
+        Image.new('RGB', (400, 200), color).save(output, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, output.getvalue(), 'image/jpeg')
+
+    def save_post(self, upload):
+        form = PostForm({'text': 'Пост с фото'}, {'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.author = self.author
+        return form.save()
+
+    def test_image_is_downscaled_and_stripped(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        post = self.save_post(self.photo())
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertIn(image.format, images.EXTENSIONS)
+            self.assertFalse(image.getexif())
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки хранятся одним файлом."""
+        first = self.save_post(self.photo('first.jpg'))
+        second = self.save_post(self.photo('second.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        other = self.save_post(self.photo(color='blue'))
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(
+            len(os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts'))), 2
+        )
@@ -1,6 +1,16 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..importer import Importer
+from ..models import (AuthorStats, Comment, Follow, Group, ImportCheckpoint,
+                      Post, User)
+from ..utils import get_posts_count
 
 
 class PostModelTest(TestCase):
@@ -56,3 +66,147 @@ class PostModelTest(TestCase):
                 print(post._meta.get_field(field).help_text)
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected)
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_posts_count_follows_create_and_delete(self):
+        """Счётчик постов меняется при создании и удалении поста."""
+        first = Post.objects.create(author=self.user, text='Пост 1')
+        Post.objects.create(author=self.user, text='Пост 2')
+        self.assertEqual(get_posts_count(self.user), 2)
+        first.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(get_posts_count(self.user), 1)
+
+    def test_rebuild_post_counts_command(self):
+        """Команда rebuild_author_stats восстанавливает счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}') for i in range(3)
+        )
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.user).posts_count, 3
+        )
+
+
+class SeedCommandTest(TestCase):
+    options = {
+        'users': 20, 'groups': 3, 'posts': 200,
+        'comments': 100, 'follows': 50,
+    }
+
+    def seed(self, seed):
+        call_command('seed', seed=seed, stdout=StringIO(), **self.options)
+        return list(Post.objects.order_by('pk').values_list(
+            'author__username', 'text', 'created'))
+
+    def test_seed_fills_tables(self):
+        """Команда seed создаёт данные и пересчитывает счётчики."""
+        self.seed(1)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('posts_count', flat=True)),
+            200,
+        )
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый --seed даёт одинаковые данные."""
+        first = self.seed(7)
+        for model in (Comment, Follow, Post, Group, User):
+            model.objects.all().delete()
+        second = self.seed(7)
+        self.assertEqual(
+            [row[:2] for row in first], [row[:2] for row in second]
+        )
+
+
+class ImportPostsCommandTest(TestCase):
+    records = [
+        {'id': 100, 'created': '2020-01-02T03:04:05+00:00',
+         'author': 'legacy_author', 'group': 'legacy-group', 'text': 'Пост'},
+        {'type': 'comment', 'post': 100, 'author': 'reader', 'text': 'Ок'},
+        {'type': 'comment', 'post': 999, 'author': 'reader', 'text': 'Нет'},
+        'не json',
+        {'type': 'follow', 'user': 'reader', 'author': 'legacy_author'},
+        {'type': 'follow', 'user': 'reader', 'author': 'legacy_author'},
+        {'type': 'follow', 'user': 'reader', 'author': 'reader'},
+    ]
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.write(self.records)
+
+    def write(self, records, mode='w'):
+        with open(self.path, mode) as file:
+            for record in records:
+                if not isinstance(record, str):
+                    record = json.dumps(record, ensure_ascii=False)
+                file.write(record + '\n')
+
+    def import_posts(self, **options):
+        call_command(
+            'import_posts', self.path, stdout=StringIO(), **options
+        )
+
+    def test_import_creates_rows(self):
+        """Импорт создаёт авторов, группы, посты, комментарии и подписки."""
+        self.import_posts()
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.author.username, 'legacy_author')
+        self.assertEqual(post.group.slug, 'legacy-group')
+        self.assertEqual(post.created.year, 2020)
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=post.author).followers_count, 1
+        )
+
+    def test_existing_follows_skipped_in_bulk(self):
+        """Повторная подписка не ломает пачку."""
+        self.import_posts()
+        self.write([
+            {'type': 'follow', 'user': 'reader', 'author': 'legacy_author'},
+        ], mode='a')
+        self.import_posts(resume=True)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_resume_after_failure(self):
+        """После сбоя импорт продолжается без повторов и пропусков."""
+        calls = []
+
+        def fail_once(importer, records):
+            if records and not calls:
+                calls.append(records)
+                raise RuntimeError('сбой')
+            return save_comments(importer, records)
+
+        save_comments = Importer.save_comments
+        with mock.patch.object(Importer, 'save_comments', fail_once):
+            with self.assertRaises(RuntimeError):
+                self.import_posts(batch_size=1)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(ImportCheckpoint.objects.get().lines, 1)
+        self.import_posts(batch_size=1, resume=True)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(ImportCheckpoint.objects.get().lines, 7)
+
+    def test_reimport_skips_known_ids(self):
+        """Без --resume файл читается заново, посты с известным id
+        пропускаются.
+        """
+        self.import_posts()
+        self.import_posts()
+        self.assertEqual(Post.objects.count(), 1)
@@ -1,9 +1,27 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock, skipUnless
+
 from django import forms
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
-from ..models import Group, Post, User, Follow
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from .. import page_cache, thumbnails, timeline
+from ..admin import SeekDatesQuerySet
+from ..search import SQLiteBackend, get_backend
+from ..timeline import rebuild_timelines
+from ..utils import EstimatedCountPaginator, get_posts_count
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 class PostTests(TestCase):
@@ -157,6 +175,34 @@ class PostTests(TestCase):
         response = self.client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, content)
 
+    def test_index_cache_refreshes_on_post_change(self):
+        "Кеш index обновляется сразу после изменения поста"
+        self.client.get(reverse('posts:index'))
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный пост'
+        post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отредактированный пост')
+        Post.objects.create(author=self.author, text='Совсем новый пост')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Совсем новый пост')
+
+    def test_card_refreshes_on_group_and_author_change(self):
+        "Карточка поста обновляется после смены адреса группы и имени автора"
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed-slug'
+        group.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.save()
+        response = self.client.get(url)
+        self.assertContains(
+            response, reverse('posts:group_list', args=('renamed-slug',))
+        )
+        self.assertContains(response, 'Автор: Лев')
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -213,6 +259,62 @@ class PaginatorViewsTest(TestCase):
             amount_posts = len(response.context.get('page_obj').object_list)
             self.assertEqual(amount_posts, settings.LEN_PAGE_OBJ)
 
+    def test_cursor_pages(self):
+        """Переход по курсорам вперёд и назад на страницах index,
+        group_list, profile.
+        """
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                first = self.client.get(url).context['page_obj']
+                next_cursor = first.paginator.next_cursor
+                second = self.client.get(
+                    url, {'cursor': next_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    len(second.object_list), settings.LEN_PAGE_OBJ
+                )
+                self.assertFalse(second.paginator.has_next)
+                previous = self.client.get(
+                    url, {'cursor': second.paginator.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    list(previous.object_list), list(first.object_list)
+                )
+
+    def test_cursor_page_without_offset_and_count(self):
+        """Страница по курсору выбирается одним запросом без OFFSET."""
+        first = self.client.get(
+            reverse('posts:index')
+        ).context['page_obj']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:index'),
+                {'cursor': first.paginator.next_cursor},
+            )
+        post_queries = [
+            query['sql'] for query in queries
+            if 'posts_post' in query['sql']
+        ]
+        self.assertEqual(len(post_queries), 1)
+        self.assertNotIn('OFFSET', post_queries[0])
+        self.assertNotIn('COUNT', post_queries[0])
+
+    def test_bad_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу."""
+        response = self.client.get(reverse('posts:index'), {'cursor': '!!'})
+        self.assertEqual(
+            len(response.context['page_obj']), settings.NUMBER_OBJECTS
+        )
+
 
 class FollowingViewsTest(TestCase):
     @classmethod
@@ -285,3 +387,795 @@ class FollowingViewsTest(TestCase):
         self.assertIn('page_obj', response.context)
         context = response.context.get('page_obj')
         self.assertNotIn(FollowingViewsTest.post, context)
+
+    def test_new_post_fans_out_to_timeline(self):
+        "Новый пост автора попадает в ленты подписчиков"
+        post = Post.objects.create(author=self.user_1, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user_2, post=post).exists()
+        )
+        response = self.authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_unfollow_prunes_timeline(self):
+        "Отписка убирает посты автора из ленты"
+        self.authorized_client_2.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user_1.username}),
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user_2))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_request(self):
+        "Посты популярного автора подмешиваются в ленту при чтении"
+        post = Post.objects.create(author=self.user_1, text='Новый пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_2, post=post).exists()
+        )
+        response = self.authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [self.post_2, post]
+        )
+
+    def test_catch_up_scheduled_when_author_drops_to_limit(self):
+        "Отписка до предела ставит дополнение лент в очередь после коммита"
+        Follow.objects.create(user=self.user_1, author=self.user_1)
+        with mock.patch.object(timeline, 'enqueue_catch_up') as enqueue, \
+                mock.patch('django.db.transaction.on_commit',
+                           side_effect=lambda func: func()):
+            with override_settings(TIMELINE_FANOUT_LIMIT=1):
+                Follow.objects.filter(user=self.user_1).delete()
+            with override_settings(TIMELINE_FANOUT_LIMIT=5):
+                Follow.objects.filter(user=self.user_2).delete()
+        enqueue.assert_called_once_with(self.user_1.pk)
+
+    @override_settings(TIMELINE_CATCH_UP_POSTS=2)
+    def test_catch_up_adds_posts_written_over_limit(self):
+        "В ленты попадают только последние посты, написанные сверх предела"
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            posts = [
+                Post.objects.create(author=self.user_1, text=f'Пост {i}')
+                for i in range(3)
+            ]
+        self.assertEqual(timeline.catch_up(self.user_1.pk), 2)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user_2).values_list('post', flat=True)),
+            {self.post_2.pk, posts[1].pk, posts[2].pk},
+        )
+        response = self.authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertIn(posts[2], response.context['page_obj'])
+
+    def test_rebuild_timelines(self):
+        "Перестройка заполняет ленты и убирает записи без подписок"
+        TimelineEntry.objects.filter(user=self.user_2).delete()
+        TimelineEntry.objects.create(
+            user=self.user_1, post=self.post_2, created=self.post_2.created
+        )
+        self.assertEqual(rebuild_timelines(), 1)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', flat=True)),
+            [self.user_2.pk] * self.user_1.posts.count(),
+        )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN в SQLite')
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def feed_query_plan(self, url, table='posts_post'):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        sql = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM "{table}"' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_feeds_use_index_without_temp_sort(self):
+        """Запросы лент идут по составным индексам без сортировки."""
+        urls = {
+            reverse('posts:index'): 'post_created_idx',
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ): 'post_group_created_idx',
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 'post_author_created_idx',
+        }
+        for url, index in urls.items():
+            with self.subTest(url=url):
+                plan = self.feed_query_plan(url)
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follow_feed_uses_timeline_index(self):
+        """Лента подписок читается из ленты читателя по индексу."""
+        plan = self.feed_query_plan(
+            reverse('posts:follow_index'), table='posts_timelineentry'
+        )
+        self.assertIn('timeline_user_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+        cls.readers = [
+            User.objects.create_user(username=f'reader_{i}')
+            for i in range(settings.NUMBER_COMMENTS + 5)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=reader, text=f'Комментарий {i}')
+            for i, reader in enumerate(cls.readers)
+        )
+
+    def test_post_detail_loads_comments_with_authors(self):
+        """Комментарии выбираются вместе с авторами одним запросом
+        и делятся на страницы.
+        """
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        comment_queries = [
+            query for query in queries
+            if 'posts_comment' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertEqual(
+            len(response.context['comments']), settings.NUMBER_COMMENTS
+        )
+
+    def test_post_detail_query_budget(self):
+        """post_detail: пост с автором, группой и счётчиком постов
+        одним запросом, комментарии вторым.
+        """
+        get_posts_count(self.author)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_post_detail_missing_post_returns_404(self):
+        """Несуществующий пост даёт 404, а не ошибку сервера."""
+        url = reverse('posts:post_detail', kwargs={'post_id': 10 ** 6})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_comments_json_pages(self):
+        """JSON комментариев отдаёт следующую страницу по курсору."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['comments']), settings.NUMBER_COMMENTS)
+        self.assertEqual(first['comments'][0]['author'], 'reader_0')
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(second['comments']), 5)
+        self.assertIsNone(second['next_cursor'])
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=small_gif, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pending_thumbnail_falls_back_to_original(self):
+        """Пока миниатюры нет, лента показывает исходную картинку,
+        после фоновой генерации — миниатюру.
+        """
+        self.assertIsNone(
+            thumbnails.get_ready_thumbnail(self.post.image, 'card')
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.get_ready_thumbnail(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_enqueue_without_async(self):
+        """Без THUMBNAILS_ASYNC миниатюры готовы сразу после enqueue."""
+        name = self.post.image.name
+        with override_settings(THUMBNAILS_ASYNC=False), \
+                mock.patch.object(thumbnails, 'get_executor') as executor:
+            thumbnails.enqueue(name).result()
+        executor.assert_not_called()
+        self.assertIsNotNone(
+            thumbnails.get_ready_thumbnail(self.post.image, 'card')
+        )
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.other = User.objects.create_user(username='TestOther')
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True, is_superuser=True
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+        )
+        cls.best = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='Котики котики котики',
+        )
+        cls.plain = Post.objects.create(
+            author=cls.other, text='Котики и собаки, а также птицы и рыбы',
+        )
+        Post.objects.create(author=cls.other, text='Только собаки')
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return response, list(response.context['page_obj'] or [])
+
+    def test_search_is_ranked(self):
+        """Поиск находит посты по словам, лучшие совпадения первыми."""
+        # Движок определяется по тестовой базе, поэтому проверка здесь,
+        # а не в декораторе: тот выполняется при импорте модуля.
+        if not isinstance(get_backend(), SQLiteBackend):
+            self.skipTest('нет FTS5')
+        _, found = self.search(q='КОТИКИ')
+        self.assertEqual(found, [self.best, self.plain])
+        _, found = self.search(q='котики собаки')
+        self.assertEqual(found, [self.plain])
+
+    def test_search_filters(self):
+        """Фильтры по автору и группе, неизвестный автор — ошибка."""
+        _, found = self.search(q='котики', author='TestOther')
+        self.assertEqual(found, [self.plain])
+        _, found = self.search(q='котики', group='test-slug')
+        self.assertEqual(found, [self.best])
+        response, found = self.search(q='котики', author='nobody')
+        self.assertEqual(found, [])
+        self.assertIn('author', response.context['form'].errors)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении, удалении и bulk_create."""
+        post = Post.objects.create(author=self.author, text='Первый вариант')
+        post.text = 'Второй вариант'
+        post.save()
+        _, found = self.search(q='первый')
+        self.assertEqual(found, [])
+        _, found = self.search(q='второй')
+        self.assertEqual(found, [post])
+        post.delete()
+        _, found = self.search(q='второй')
+        self.assertEqual(found, [])
+        Post.objects.bulk_create([Post(author=self.author, text='Ёжики')])
+        _, found = self.search(q='ёжики')
+        self.assertEqual(len(found), 1)
+
+    def test_search_keyset_pages(self):
+        """Выдача листается курсором и сохраняет запрос в ссылках."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Хомяк номер {i}')
+            for i in range(settings.NUMBER_OBJECTS + 3)
+        )
+        response, first = self.search(q='хомяк')
+        self.assertEqual(len(first), settings.NUMBER_OBJECTS)
+        self.assertContains(response, '?q=%D1%85%D0%BE%D0%BC%D1%8F%D0%BA')
+        cursor = response.context['page_obj'].paginator.next_cursor
+        _, second = self.search(q='хомяк', cursor=cursor)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+
+    def test_admin_search(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            set(Post.objects.filter(text__icontains='собаки')),
+        )
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True, is_superuser=True
+        )
+        cls.groups = Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}') for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def create_posts(self, count):
+        Post.objects.bulk_create(
+            Post(author=self.staff, group=self.groups[i % 5], text=f'Пост {i}')
+            for i in range(count)
+        )
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка постов не зависит от числа строк."""
+        self.create_posts(5)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        self.create_posts(50)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.url)
+        self.assertEqual(len(small), len(large))
+        self.assertContains(response, 'Группа 4')
+
+    def test_group_choices_follow_group_changes(self):
+        """Кешированный список групп сбрасывается при изменении группы."""
+        self.create_posts(1)
+        self.client.get(self.url)
+        Group.objects.create(title='Новая группа', slug='new-group')
+        self.assertContains(self.client.get(self.url), 'Новая группа')
+
+    def test_estimated_count(self):
+        """Без фильтров число строк берётся из оценки, с фильтром точно."""
+        self.create_posts(3)
+        Post.objects.filter(text='Пост 0').delete()
+        posts = Post.objects.all()
+        with mock.patch.object(EstimatedCountPaginator, 'exact_below', 0):
+            self.assertEqual(EstimatedCountPaginator(posts, 10).count, 3)
+            self.assertEqual(
+                EstimatedCountPaginator(
+                    posts.filter(text='Пост 1'), 10).count,
+                1,
+            )
+        self.assertEqual(EstimatedCountPaginator(posts, 10).count, 2)
+
+    def test_seek_dates_match_queryset_dates(self):
+        """dates() по индексу совпадает с обычным QuerySet.dates()."""
+        self.create_posts(3)
+        Post.objects.filter(text='Пост 1').update(
+            created='2020-03-15 10:00Z')
+        Post.objects.filter(text='Пост 2').update(
+            created='2020-12-31 23:59Z')
+        posts = Post.objects.all()
+        seek = SeekDatesQuerySet(Post, posts.query)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(
+                seek.dates('created', kind), list(posts.dates('created', kind))
+            )
+        response = self.client.get(self.url, {'created__year': 2020})
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+
+class ExportViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+        )
+        cls.old = Post.objects.create(author=cls.author, text='Старый пост')
+        Post.objects.filter(pk=cls.old.pk).update(created='2020-01-01 10:00Z')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост, "с кавычками"',
+        )
+        Post.objects.create(author=cls.staff, text='Пост сотрудника')
+        Comment.objects.create(
+            post=cls.post, author=cls.staff, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def export(self, kind='posts', **params):
+        response = self.client.get(
+            reverse('posts:export', args=(kind,)), params
+        )
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_export_is_staff_only(self):
+        """Выгрузка доступна только сотрудникам."""
+        url = reverse('posts:export', args=('posts',))
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(Client().get(url).status_code, 302)
+
+    def test_ndjson_export_with_filters(self):
+        """NDJSON: строка на пост, фильтры по автору, группе и датам."""
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['id'], self.old.pk)
+        _, body = self.export(author='TestAuthor', since='2021-01-01')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.post.pk])
+        self.assertEqual(rows[0]['group'], 'test-slug')
+        _, body = self.export(until='2020-01-01')
+        self.assertEqual(len(body.splitlines()), 1)
+        _, body = self.export('comments', group='test-slug')
+        self.assertEqual(json.loads(body)['post'], self.post.pk)
+
+    def test_csv_export(self):
+        """CSV с заголовком и экранированием."""
+        response, body = self.export(format='csv', group='test-slug')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,created,author,group,text,image')
+        self.assertIn('"Пост, ""с кавычками"""', lines[1])
+
+    def test_bad_filters(self):
+        """Неизвестные фильтры и выгрузки дают 400 и 404."""
+        response = self.client.get(
+            reverse('posts:export', args=('posts',)), {'author': 'nobody'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('author', response.json()['errors'])
+        response = self.client.get(reverse('posts:export', args=('users',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_command(self):
+        """Команда export пишет ту же выгрузку в stdout."""
+        out = StringIO()
+        call_command('export', 'posts', author='TestStaff', stdout=out)
+        self.assertEqual(
+            json.loads(out.getvalue())['text'], 'Пост сотрудника'
+        )
+
+    def test_export_command_output_is_utf8(self):
+        """Файл выгрузки пишется в UTF-8 независимо от локали."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.ndjson')
+            with mock.patch('builtins.open', wraps=open) as opened:
+                call_command(
+                    'export', 'posts', author='TestStaff', output=path,
+                )
+            self.assertEqual(opened.call_args[1]['encoding'], 'utf-8')
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual(
+                    json.loads(file.read())['text'], 'Пост сотрудника'
+                )
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def etag(self, url, **params):
+        return self.client.get(url, params)['ETag']
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304 без шаблона."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.templates)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response.content, b'')
+
+    def test_etag_changes(self):
+        """ETag меняется вместе с содержимым страницы."""
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        profile = reverse('posts:profile', args=(self.author.username,))
+        follow = reverse('posts:follow_index')
+        etags = {
+            url: self.etag(url) for url in (index, detail, profile, follow)
+        }
+        self.assertNotEqual(self.etag(index, page=2), etags[index])
+        self.assertNotEqual(Client().get(index)['ETag'], etags[index])
+
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий',
+        )
+        self.assertNotEqual(self.etag(detail), etags[detail])
+        # Число комментариев выводится на карточках лент, от него же
+        # зависит порядок «Обсуждаемых».
+        self.assertNotEqual(self.etag(index), etags[index])
+        self.assertNotEqual(self.etag(profile), etags[profile])
+        etags[index] = self.etag(index)
+        etags[profile] = self.etag(profile)
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertNotEqual(self.etag(profile), etags[profile])
+        self.assertNotEqual(self.etag(follow), etags[follow])
+
+        etags[detail] = self.etag(detail)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertNotEqual(self.etag(index), etags[index])
+        self.assertNotEqual(self.etag(detail), etags[detail])
+
+    def test_deleted_post(self):
+        """После удаления поста старый ETag не даёт 304."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        etag = self.etag(url)
+        Post.objects.filter(pk=self.post.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentCountsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def comment(self, post, text='Комментарий'):
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)), {'text': text}
+        )
+
+    def test_counts_follow_comments(self):
+        """Счётчик и дата последнего комментария меняются вместе
+        с комментариями, а правка поста их не затирает.
+        """
+        post = self.posts[0]
+        self.client.force_login(self.author)
+        self.client.get(reverse('posts:post_edit', args=(post.pk,)))
+        self.comment(post)
+        self.comment(post)
+        post.refresh_from_db()
+        last = Comment.objects.latest('created')
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(post.last_commented_at, last.created)
+        self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Новый текст'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        last.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            post.last_commented_at, post.comments.get().created
+        )
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertIsNone(post.last_commented_at)
+
+    def test_rebuild_comment_counts(self):
+        """Команда пересчитывает счётчики, испорченные в обход сигналов."""
+        self.comment(self.posts[1])
+        Post.objects.update(comments_count=5, last_commented_at=None)
+        call_command(
+            'rebuild_comment_counts', batch_size=3, stdout=StringIO()
+        )
+        counts = dict(Post.objects.values_list('pk', 'comments_count'))
+        self.assertEqual(counts[self.posts[1].pk], 1)
+        self.assertEqual(sum(counts.values()), 1)
+        self.assertIsNotNone(
+            Post.objects.get(pk=self.posts[1].pk).last_commented_at
+        )
+
+    @override_settings(NUMBER_OBJECTS=2)
+    def test_discussed_order(self):
+        """Лента «Обсуждаемые» идёт по числу комментариев по курсору."""
+        for post, total in zip(self.posts, (1, 3, 0, 2)):
+            for _ in range(total):
+                self.comment(post)
+        url = reverse('posts:index')
+        response = self.client.get(url, {'order': 'discussed'})
+        page = response.context['page_obj']
+        self.assertEqual(
+            list(page), [self.posts[1], self.posts[3]]
+        )
+        self.assertContains(response, 'Комментариев: 3')
+        response = self.client.get(url, {
+            'order': 'discussed',
+            'cursor': page.paginator.next_cursor,
+        })
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.posts[0], self.posts[2]],
+        )
+        previous = response.context['page_obj'].paginator.previous_cursor
+        response = self.client.get(
+            url, {'order': 'discussed', 'cursor': previous}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.posts[1], self.posts[3]],
+        )
+        # Новые комментарии меняют порядок и счётчики в закешированном
+        # фрагменте главной.
+        for _ in range(4):
+            self.comment(self.posts[2])
+        response = self.client.get(url, {'order': 'discussed'})
+        self.assertContains(response, 'Комментариев: 4')
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.posts[2], self.posts[1]],
+        )
+
+
+@override_settings(PAGE_CACHE_ENABLED=True, NUMBER_OBJECTS=2)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+        )
+        for i in range(5):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}',
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_guest_page_is_cached(self):
+        """Повторная страница гостя отдаётся из кеша без запросов,
+        после нового поста страница отрисовывается заново.
+        """
+        url = reverse('posts:index')
+        first = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.guest_client.get(url)
+        self.assertEqual(cached.content, first.content)
+        self.assertIn('Cookie', cached['Vary'])
+        Post.objects.create(author=self.author, text='Самый новый пост')
+        self.assertIsNotNone(self.guest_client.get(url).context)
+
+    def test_comment_refreshes_guest_page(self):
+        """После комментария гость получает страницу с новым счётчиком."""
+        url = reverse('posts:index')
+        post = self.guest_client.get(url).context['page_obj'][0]
+        Comment.objects.create(
+            post=post, author=self.author, text='Комментарий',
+        )
+        self.assertContains(self.guest_client.get(url), 'Комментариев: 1')
+
+    def test_cache_is_bypassed(self):
+        """Вошедшие пользователи, запросы с cookie сессии и с лишними
+        параметрами идут мимо кеша.
+        """
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(url), 'TestAuthor')
+        self.guest_client.cookies[settings.SESSION_COOKIE_NAME] = 'stale'
+        self.assertIsNotNone(self.guest_client.get(url).context)
+        self.assertIsNotNone(Client().get(url, {'utm': 'x'}).context)
+
+    def test_warm_renders_first_pages(self):
+        """warm отрисовывает первые страницы главной и группы."""
+        with override_settings(PAGE_CACHE_WARM_PAGES=2):
+            page_cache.warm(self.group.pk)
+        index = reverse('posts:index')
+        group = reverse('posts:group_list', args=(self.group.slug,))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(index)
+            self.guest_client.get(group)
+        cursor = re.search(r'cursor=([\w-]+)', response.content.decode())
+        with self.assertNumQueries(0):
+            self.guest_client.get(index, {'cursor': cursor.group(1)})
+        self.assertIsNotNone(Client().get(group, {'page': 3}).context)
+
+    def test_enqueue_warms_in_background(self):
+        """Прогрев идёт в фоновом потоке, одинаковые задачи не
+        ставятся в очередь дважды.
+        """
+        threads = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fake_warm(group_id):
+            threads.append((threading.current_thread(), group_id))
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(page_cache, 'warm', fake_warm):
+            future = page_cache.enqueue(self.group.pk)
+            started.wait(5)
+            self.assertIsNone(page_cache.enqueue(self.group.pk))
+            release.set()
+            future.result(5)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0][0], threading.current_thread())
+        self.assertEqual(threads[0][1], self.group.pk)
+        with override_settings(PAGE_CACHE_ENABLED=False):
+            self.assertIsNone(page_cache.enqueue(self.group.pk))
+
+    def test_warm_pages_command(self):
+        """Команда warm_pages прогревает главную и ленты групп."""
+        call_command('warm_pages', pages=1, stdout=StringIO())
+        with self.assertNumQueries(0):
+            self.guest_client.get(reverse('posts:index'))
+            self.guest_client.get(
+                reverse('posts:group_list', args=(self.group.slug,))
+            )
@@ -0,0 +1,98 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+sorl-thumbnail создаёт миниатюру при первой отрисовке шаблона, то есть
+внутри запроса. Здесь миниатюры всех размеров из
+``settings.THUMBNAIL_PRESETS`` создаются в пуле потоков сразу после
+сохранения поста, а шаблоны берут только уже готовые миниатюры.
+Без ``THUMBNAILS_ASYNC`` миниатюры создаются в вызывающем потоке.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from core import db_router
+from django.conf import settings
+from django.db import connection
+from sorl.thumbnail import base, default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .fragments import bump_feed_version
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из хранилища sorl или None. Ничего не создаёт."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ThumbnailBackend()
+
+
+def get_ready_thumbnail(image, preset):
+    if not image:
+        return None
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def generate(name):
+    """Создаёт миниатюры всех размеров для картинки name."""
+    try:
+        for geometry, options in settings.THUMBNAIL_PRESETS.values():
+            backend.get_thumbnail(name, geometry, **options)
+        # Страницы, отрисованные без миниатюры, нужно перерисовать.
+        bump_feed_version()
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def _work(name):
+    try:
+        with db_router.primary():
+            generate(name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def enqueue(name):
+    """Ставит картинку в очередь, если она ещё не ждёт обработки."""
+    if not settings.THUMBNAILS_ASYNC:
+        job = Future()
+        job.set_result(generate(name))
+        return job
+    with _lock:
+        if name in _pending:
+            return None
+        _pending.add(name)
+    return get_executor().submit(_work, name)
@@ -0,0 +1,206 @@
+"""Лента подписок, заполняемая при записи (fan-out-on-write).
+
+При публикации поста ссылка на него раскладывается по лентам всех
+подписчиков автора, при подписке лента дополняется постами автора,
+при отписке — очищается. Для авторов, у которых подписчиков больше
+``settings.TIMELINE_FANOUT_LIMIT``, лента не заполняется: их посты
+подмешиваются при чтении (fan-out-on-read). Когда число подписчиков
+опускается до предела, посты, написанные сверх предела, раскладываются
+по лентам подписчиков (``catch_up``), иначе они пропали бы из лент.
+Это до ``TIMELINE_FANOUT_LIMIT`` подписчиков на
+``TIMELINE_CATCH_UP_POSTS`` постов, поэтому работа идёт в фоновом
+потоке после коммита отписки, а не в её запросе.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core import db_router
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .utils import TimelinePaginator, paginate
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def is_celebrity(followers_count):
+    return followers_count > settings.TIMELINE_FANOUT_LIMIT
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post, followers_count):
+    """Добавляет пост в ленты подписчиков автора."""
+    if is_celebrity(followers_count):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, created=post.created)
+        for user_id in followers.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def backfill(user_id, author_id, followers_count):
+    """Добавляет в ленту читателя все посты автора."""
+    if is_celebrity(followers_count):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'created').order_by()
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+        for post_id, created in posts.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def catch_up(author_id):
+    """Раскладывает по лентам подписчиков посты автора, которых нет ни
+    в одной ленте, то есть написанные, пока он был популярным, но не
+    больше ``TIMELINE_CATCH_UP_POSTS`` последних. Возвращает число
+    разложенных постов.
+    """
+    in_timelines = TimelineEntry.objects.filter(post=OuterRef('pk'))
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .annotate(in_timelines=Exists(in_timelines))
+        .filter(in_timelines=False)
+        .order_by('-created', '-id')
+        .values_list('pk', 'created')[:settings.TIMELINE_CATCH_UP_POSTS]
+    )
+    if not posts:
+        return 0
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+        for user_id in followers.iterator(chunk_size=BATCH_SIZE)
+        for post_id, created in posts
+    )
+    return len(posts)
+
+
+def _work(author_id):
+    try:
+        with db_router.primary():
+            catch_up(author_id)
+    except Exception:
+        logger.exception(
+            'Не удалось дополнить ленты постами автора %s', author_id
+        )
+    finally:
+        with _lock:
+            _pending.discard(author_id)
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='timeline',
+            )
+        return _executor
+
+
+def enqueue_catch_up(author_id):
+    """Ставит catch_up в очередь, если для автора он ещё не ждёт."""
+    with _lock:
+        if author_id in _pending:
+            return None
+        _pending.add(author_id)
+    return get_executor().submit(_work, author_id)
+
+
+def schedule_catch_up(author_id, followers_count):
+    """После коммита ставит catch_up в очередь, если автор только что
+    перестал быть популярным.
+    """
+    if followers_count != settings.TIMELINE_FANOUT_LIMIT:
+        return
+    transaction.on_commit(lambda: enqueue_catch_up(author_id))
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты читателя посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id,
+    ).delete()
+
+
+def rebuild_timeline(user_id):
+    """Заново заполняет ленту одного читателя в одной транзакции:
+    читатели видят старую ленту, пока не готова новая.
+    """
+    follows = Follow.objects.filter(user_id=user_id).select_related(
+        'author__post_stats'
+    ).order_by()
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        rebuilt = 0
+        for follow in follows:
+            try:
+                followers_count = follow.author.post_stats.followers_count
+            except AuthorStats.DoesNotExist:
+                followers_count = 0
+            backfill(follow.user_id, follow.author_id, followers_count)
+            rebuilt += 1
+    return rebuilt
+
+
+def rebuild_timelines():
+    """Заново заполняет ленты по текущим подпискам, например после
+    bulk_create, который не отправляет сигналы. Ленты перестраиваются
+    по одному читателю, сбой посередине не стирает остальные.
+    """
+    readers = Follow.objects.values('user_id')
+    TimelineEntry.objects.exclude(user_id__in=readers).delete()
+    user_ids = readers.distinct().order_by('user_id').values_list(
+        'user_id', flat=True
+    )
+    return sum(
+        rebuild_timeline(user_id)
+        for user_id in user_ids.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def get_timeline_page(request, user):
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group',
+    )
+    celebrity_ids = list(AuthorStats.objects.filter(
+        author__following__user=user,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    celebrity_posts = None
+    if celebrity_ids:
+        celebrity_posts = Post.objects.filter(
+            author_id__in=celebrity_ids
+        ).select_related('author', 'group')
+    post_list = Post.objects.select_related(
+        'author', 'group'
+    ).filter(author__following__user=user)
+    paginator = TimelinePaginator(
+        post_list, settings.NUMBER_OBJECTS, entries, celebrity_posts,
+    )
+    return paginate(request, paginator)
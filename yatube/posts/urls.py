@@ -9,8 +9,13 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'),
     path('create/', views.post_create, name='create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -18,6 +23,7 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('export/<str:kind>/', views.export, name='export'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
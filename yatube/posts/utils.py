@@ -1,8 +1,356 @@
+import base64
+import binascii
+import json
+from contextlib import contextmanager
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import connections, transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def flip(key):
+    """Обратный порядок для ключа сортировки."""
+    return key[1:] if key.startswith('-') else f'-{key}'
+
+
+class CursorPaginator(Paginator):
+    """Постраничная навигация по ключу (created, id).
+
+    Каждая страница выбирается условием по ключу последней записи
+    предыдущей страницы и ``LIMIT per_page + 1``, без ``OFFSET``
+    и без ``COUNT(*)``. Поэтому страница N стоит столько же,
+    сколько первая. Номера страниц (``?page=N``) поддерживаются
+    только для старых ссылок. Ключ с минусом (``-comments_count``)
+    идёт по убыванию.
+    """
+
+    def __init__(self, object_list, per_page, keys=('created', 'id')):
+        super().__init__(object_list.order_by(*keys), per_page)
+        self.keys = keys
+        self.cursor = None
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.has_next = False
+        self.has_previous = False
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def dump_key(self, obj, key):
+        field = self.object_list.model._meta.get_field(key)
+        return field.value_to_string(obj)
+
+    def load_key(self, key, value):
+        field = self.object_list.model._meta.get_field(key)
+        return field.to_python(value)
+
+    @property
+    def key_names(self):
+        return [key.lstrip('-') for key in self.keys]
+
+    def encode_cursor(self, obj, direction):
+        values = [self.dump_key(obj, key) for key in self.key_names]
+        raw = json.dumps([direction, values])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+                raise InvalidCursor(token)
+            if len(values) != len(self.keys):
+                raise InvalidCursor(token)
+            values = [
+                self.load_key(key, value)
+                for key, value in zip(self.key_names, values)
+            ]
+        except (binascii.Error, TypeError, ValueError,
+                ValidationError) as error:
+            raise InvalidCursor(token) from error
+        return direction, values
+
+    def _seek(self, values, reverse, keys=None):
+        """Условие «ключ строго после (или до) values» для составного
+        ключа: (a > x) OR (a = x AND b > y) ...
+        """
+        keys = keys or self.keys
+        names = [key.lstrip('-') for key in keys]
+        condition = Q()
+        for i, key in enumerate(keys):
+            descending = key.startswith('-')
+            lookup = 'lt' if reverse != descending else 'gt'
+            term = Q(**{f'{names[i]}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(names[:i], values):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        return condition
+
+    def _slice(self, queryset, values, reverse, keys=None):
+        """per_page + 1 записей queryset после (или до) ключа values."""
+        keys = keys or self.keys
+        ordering = [flip(key) if reverse else key for key in keys]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse, keys))
+        return list(queryset[:self.per_page + 1])
+
+    def _trim(self, rows, reverse):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        return rows, has_more
+
+    def _fetch(self, values=None, reverse=False):
+        rows = self._slice(self.object_list, values, reverse)
+        return self._trim(rows, reverse)
+
+    def _make_page(self, rows, number=None):
+        if self.has_next and rows:
+            self.next_cursor = self.encode_cursor(rows[-1], CURSOR_NEXT)
+        if self.has_previous and rows:
+            self.previous_cursor = self.encode_cursor(
+                rows[0], CURSOR_PREVIOUS
+            )
+        return Page(rows, number, self)
+
+    def first_page(self):
+        rows, self.has_next = self._fetch()
+        self.has_previous = False
+        return self._make_page(rows, 1)
+
+    def get_cursor_page(self, token):
+        """Страница по непрозрачному курсору из ``?cursor=``.
+        Некорректный курсор даёт первую страницу.
+        """
+        try:
+            direction, values = self.decode_cursor(token)
+        except InvalidCursor:
+            return self.first_page()
+        self.cursor = token
+        if direction == CURSOR_PREVIOUS:
+            rows, self.has_previous = self._fetch(values, reverse=True)
+            self.has_next = True
+        else:
+            rows, self.has_next = self._fetch(values)
+            self.has_previous = True
+        if not rows:
+            self.cursor = None
+            return self.first_page()
+        return self._make_page(rows)
+
+    def get_page(self, number):
+        """Совместимость со ссылками вида ``?page=N`` (OFFSET)."""
+        page = super().get_page(number)
+        self.has_next = page.has_next()
+        self.has_previous = page.has_previous()
+        return self._make_page(list(page.object_list), page.number)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: записи TimelineEntry читателя, слитые с постами
+    популярных авторов, для которых лента не заполняется при записи.
+    object_list нужен только для ссылок вида ``?page=N``.
+    """
 
+    entry_keys = ('created', 'post_id')
 
-def get_page(request, post_list):
-    paginator = Paginator(post_list, settings.NUMBER_OBJECTS)
+    def __init__(self, object_list, per_page, entries, celebrity_posts):
+        super().__init__(object_list, per_page)
+        self.entries = entries
+        self.celebrity_posts = celebrity_posts
+
+    def _fetch(self, values=None, reverse=False):
+        entries = self._slice(
+            self.entries, values, reverse, keys=self.entry_keys
+        )
+        posts = {entry.post_id: entry.post for entry in entries}
+        if self.celebrity_posts is not None:
+            for post in self._slice(self.celebrity_posts, values, reverse):
+                posts[post.pk] = post
+        rows = sorted(
+            posts.values(),
+            key=lambda post: (post.created, post.pk),
+            reverse=reverse,
+        )
+        return self._trim(rows, reverse)
+
+
+def estimate_count(queryset):
+    """Примерное число строк таблицы queryset без COUNT(*) или None."""
+    connection = connections[queryset.db]
+    model = queryset.model
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [model._meta.db_table],
+            )
+        elif connection.vendor == 'sqlite':
+            # rowid растёт монотонно, MAX читается из индекса за O(log n).
+            # После удалений оценка завышена.
+            cursor.execute(f'SELECT MAX(rowid) FROM {table}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки. Для запроса без фильтров число записей
+    берётся из оценки базы, а не из ``COUNT(*)`` по всей таблице.
+    Небольшие и отфильтрованные выборки считаются точно.
+    """
+
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+def paginate(request, paginator):
+    """Страница по ``?cursor=``, ``?page=N`` или первая страница."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number:
+        return paginator.get_page(page_number)
+    return paginator.first_page()
+
+
+def get_page(request, object_list, per_page=None, keys=('created', 'id')):
+    paginator = CursorPaginator(
+        object_list, per_page or settings.NUMBER_OBJECTS, keys=keys
+    )
+    return paginate(request, paginator)
+
+
+@contextmanager
+def keep_created(*models):
+    """Отключает auto_now_add у поля created, чтобы сохранить даты
+    при загрузке данных.
+    """
+    fields = [model._meta.get_field('created') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+GROUP_CHOICES_KEY = 'group_choices'
+
+
+def group_choices():
+    """Список (pk, название) всех групп из кеша. Сбрасывается сигналами
+    при изменении групп.
+    """
+    choices = cache.get(GROUP_CHOICES_KEY)
+    if choices is None:
+        choices = list(
+            Group.objects.order_by('title').values_list('pk', 'title')
+        )
+        cache.set(GROUP_CHOICES_KEY, choices, settings.OBJECT_CACHE_TIMEOUT)
+    return choices
+
+
+def author_stats_defaults(author_id):
+    """Начальные значения счётчиков автора, посчитанные по таблицам."""
+    return {
+        'posts_count': Post.objects.filter(author_id=author_id).count(),
+        'followers_count': Follow.objects.filter(
+            author_id=author_id).count(),
+    }
+
+
+def get_author_stats(author):
+    """Счётчики автора. Если их ещё нет, они считаются один раз
+    и сохраняются.
+    """
+    try:
+        return author.post_stats
+    except AuthorStats.DoesNotExist:
+        stats, _ = AuthorStats.objects.get_or_create(
+            author=author, defaults=author_stats_defaults(author.pk),
+        )
+        return stats
+
+
+def get_posts_count(author):
+    return get_author_stats(author).posts_count
+
+
+def rebuild_author_stats(batch_size=1000):
+    """Пересчитывает счётчики всех авторов одним проходом."""
+    totals = User.objects.annotate(
+        posts_total=Count('posts', distinct=True),
+        followers_total=Count('following', distinct=True),
+    ).values_list('pk', 'posts_total', 'followers_total').order_by()
+    rebuilt = 0
+    with transaction.atomic():
+        AuthorStats.objects.all().delete()
+        batch = []
+        for author_id, posts_total, followers_total in totals.iterator(
+                chunk_size=batch_size):
+            batch.append(AuthorStats(
+                author_id=author_id,
+                posts_count=posts_total,
+                followers_count=followers_total,
+            ))
+            if len(batch) >= batch_size:
+                AuthorStats.objects.bulk_create(batch)
+                rebuilt += len(batch)
+                batch = []
+        AuthorStats.objects.bulk_create(batch)
+        rebuilt += len(batch)
+    return rebuilt
+
+
+def rebuild_comment_counts(batch_size=1000):
+    """Пересчитывает счётчики комментариев постов пачками по pk."""
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    totals = comments.values('post').annotate(total=Count('id'))
+    last = comments.values('post').annotate(last=Max('created'))
+    pks = Post.objects.order_by('pk').values_list('pk', flat=True)
+    rebuilt = 0
+    start = 0
+    while True:
+        bound = pks.filter(pk__gt=start)[batch_size - 1:batch_size].first()
+        batch = Post.objects.filter(pk__gt=start)
+        if bound is not None:
+            batch = batch.filter(pk__lte=bound)
+        with transaction.atomic():
+            rebuilt += batch.update(
+                comments_count=Coalesce(Subquery(totals.values('total')), 0),
+                last_commented_at=Subquery(last.values('last')),
+            )
+        if bound is None:
+            return rebuilt
+        start = bound
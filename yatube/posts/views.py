@@ -1,22 +1,52 @@
+from core import object_cache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, Follow
-from .forms import PostForm, CommentForm
+from .models import AuthorStats, Post, Group, Follow
+from . import etags
+from . import export as exports
+from .forms import ExportForm, PostForm, CommentForm, SearchForm
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
-from .utils import get_page
+from django.views.decorators.http import etag
+from . import thumbnails
+from .fragments import get_cards_version
+from .page_cache import anonymous_page_cache
+from .search import get_search_page
+from .timeline import get_timeline_page
+from .utils import get_page, get_posts_count
 
+# «Обсуждаемые»: по убыванию числа комментариев, по индексу
+# post_discussed_idx.
+DISCUSSED_KEYS = ('-comments_count', '-id')
 
+
+@etag(etags.index_etag)
+@anonymous_page_cache
 def index(request):
     post_list = Post.objects.select_related('group', 'author')
-    page_obj = get_page(request, post_list)
+    order = request.GET.get('order')
+    if order == 'discussed':
+        page_obj = get_page(request, post_list, keys=DISCUSSED_KEYS)
+    else:
+        order = ''
+        page_obj = get_page(request, post_list)
     context = {
         'page_obj': page_obj,
+        'cards_version': get_cards_version(),
+        'order': order,
+        'query': f'order={order}' if order else '',
     }
     return render(request, 'posts/index.html', context)
 
 
+@etag(etags.group_etag)
+@anonymous_page_cache
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = object_cache.get_or_404(Group, slug=slug)
     posts = group.posts.select_related('author').all()
     page_obj = get_page(request, posts)
     context = {
@@ -26,8 +56,30 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+def search(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        page_obj = get_search_page(
+            request, form.cleaned_data['q'],
+            author=form.cleaned_data['author'],
+            group=form.cleaned_data['group'],
+            per_page=settings.NUMBER_OBJECTS,
+        )
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    query.pop('page', None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query': query.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@etag(etags.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = object_cache.get_or_404(User, username=username)
     posts = author.posts.select_related('group')
     page_obj = get_page(request, posts)
     following = (
@@ -40,18 +92,33 @@ def profile(request, username):
     context = {
         'author': author,
         'posts': posts,
-        'posts_count': len(posts),
+        'posts_count': get_posts_count(author),
         'page_obj': page_obj,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@etag(etags.post_etag)
 def post_detail(request, post_id):
-    post = Post.objects.get(pk=post_id)
-    count = Post.objects.filter(author=post.author).count()
+    posts_count = AuthorStats.objects.filter(
+        author_id=OuterRef('author_id')
+    ).values('posts_count')[:1]
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group').annotate(
+            author_posts_count=Subquery(posts_count)
+        ),
+        pk=post_id,
+    )
+    count = post.author_posts_count
+    if count is None:
+        count = get_posts_count(post.author)
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = get_page(
+        request,
+        post.comments.select_related('author'),
+        settings.NUMBER_COMMENTS,
+    )
     context = {
         'post_id': post_id,
         'count': count,
@@ -62,6 +129,28 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Страница комментариев в JSON для подгрузки по курсору."""
+    post = object_cache.get_or_404(Post, pk=post_id)
+    comments = get_page(
+        request,
+        post.comments.select_related('author'),
+        settings.NUMBER_COMMENTS,
+    )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            }
+            for comment in comments
+        ],
+        'next_cursor': comments.paginator.next_cursor,
+    })
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -72,6 +161,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            transaction.on_commit(lambda: thumbnails.enqueue(post.image.name))
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -81,8 +172,8 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    post = object_cache.get_or_404(Post, pk=post_id)
+    if request.user.pk != post.author_id:
         return redirect("posts:post_detail", post_id)
     form = PostForm(
         request.POST or None,
@@ -90,7 +181,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if post.image and 'image' in form.changed_data:
+            transaction.on_commit(lambda: thumbnails.enqueue(post.image.name))
         return redirect("posts:post_detail", post_id)
     context = {
         'is_edit': True,
@@ -102,7 +195,7 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     # Получите пост и сохраните его в переменную post.
-    post = get_object_or_404(Post, pk=post_id)
+    post = object_cache.get_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -113,13 +206,11 @@ def add_comment(request, post_id):
 
 
 @login_required
+@etag(etags.follow_etag)
 def follow_index(request):
     template = 'posts/follow.html'
     title = 'Лента моих подписок'
-    post = Post.objects.select_related(
-        'author'
-    ).filter(author__following__user=request.user)
-    page_obj = get_page(request, post)
+    page_obj = get_timeline_page(request, request.user)
     context = {
         'title': title,
         'page_obj': page_obj,
@@ -142,3 +233,23 @@ def profile_unfollow(request, username):
         Follow, user=request.user, author__username=username,
     ).delete()
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def export(request, kind):
+    """Потоковая выгрузка постов или комментариев для сотрудников."""
+    if kind not in exports.EXPORTS:
+        raise Http404('Неизвестная выгрузка')
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    filters = form.cleaned_data.copy()
+    output_format = filters.pop('format')
+    response = StreamingHttpResponse(
+        exports.stream(kind, output_format, **filters),
+        content_type=exports.CONTENT_TYPES[output_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{output_format}"'
+    )
+    return response
@@ -46,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.db_router.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,9 +88,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами вместе со своим кешем
+        # страниц и mmap (core.sqlite_tuning).
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 60)),
     }
 }
 
+# PRAGMA для каждого нового соединения с SQLite (core.sqlite_tuning).
+# У отдельной базы их можно заменить ключом 'PRAGMAS' в DATABASES.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 2 ** 20,
+    'cache_size': -32000,
+    'temp_store': 'MEMORY',
+}
+
+# Реплики только для чтения (core.db_router): {алиас: вес}. Для проверки
+# на нескольких файлах SQLite:
+# YATUBE_DB_REPLICAS="replica1.sqlite3:2,replica2.sqlite3" и команда
+# sync_replicas, которая копирует в них default.
+DATABASE_REPLICAS = {}
+_replicas = os.environ.get('YATUBE_DB_REPLICAS', '')
+for _number, _spec in enumerate(filter(None, _replicas.split(',')), 1):
+    _name, _, _weight = _spec.rpartition(':')
+    if not _weight.isdigit():
+        _name, _weight = _spec, '1'
+    DATABASES[f'replica{_number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, _name),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[f'replica{_number}'] = int(_weight)
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+REPLICA_PIN_COOKIE = 'read_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -136,12 +173,108 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 NUMBER_OBJECTS = 10
+NUMBER_COMMENTS = 20
 AMOUNT_POSTS = 13
 LEN_PAGE_OBJ = 3
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов, написанных сверх предела, попадает в ленты
+# подписчиков, когда их число опускается до TIMELINE_FANOUT_LIMIT.
+TIMELINE_CATCH_UP_POSTS = 100
+OBJECT_CACHE_TIMEOUT = 300
+# Миниатюры создаются в пуле потоков. При DEBUG — сразу в потоке
+# запроса после коммита, чтобы тесты и отладка не зависели от фона.
+THUMBNAILS_ASYNC = not DEBUG
+THUMBNAIL_WORKERS = 2
+EXPORT_CHUNK_SIZE = 2000
+# Двухуровневый кеш фрагментов (core.tiered_cache): срок и размер
+# кеша процесса, блокировка пересчёта, сколько секунд после срока
+# отдаётся старое значение и насколько рано начинается пересчёт.
+TIERED_CACHE_ALIAS = 'default'
+TIERED_CACHE_L1_TIMEOUT = 5
+TIERED_CACHE_L1_MAX_ENTRIES = 1000
+TIERED_CACHE_LOCK_TIMEOUT = 10
+TIERED_CACHE_GRACE = 300
+TIERED_CACHE_BETA = 1.0
+# Кеш страниц лент для гостей и число страниц, которые
+# отрисовываются заранее после публикации поста.
+PAGE_CACHE_ENABLED = not DEBUG
+PAGE_CACHE_TIMEOUT = 600
+PAGE_CACHE_WARM_PAGES = 3
+# Картинки постов: наибольшая сторона после загрузки, формат и качество.
+IMAGE_MAX_SIZE = 1920
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 82
+THUMBNAIL_PRESETS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_WINDOW = 1000
+INSTRUMENTATION_FLUSH_EVERY = 100
+# Окна замеров процессов для команды timings, каталог только для
+# владельца.
+INSTRUMENTATION_DUMP_DIR = os.environ.get(
+    'YATUBE_TIMINGS_DIR', os.path.join(BASE_DIR, 'timings')
+)
+# Журнал медленных запросов (core.slow_queries). None — не замерять.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_EXPLAIN = True
+SLOW_QUERY_BUFFER = 200
+SLOW_QUERY_MODULES = ('posts.views',)
+# Параметры запросов к этим таблицам в журнал не пишутся.
+SLOW_QUERY_SENSITIVE_TABLES = ('auth_user', 'django_session')
+LOG_DIR = os.environ.get('YATUBE_LOG_DIR', os.path.join(BASE_DIR, 'logs'))
+SLOW_QUERY_LOG_FILE = os.path.join(LOG_DIR, 'slow-queries.log')
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
+BENCHMARK_RESULTS = os.path.join(BENCHMARK_DIR, 'latest.json')
+BENCHMARK_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# В отладке кеш свой у процесса, в работе — общий файл SQLite
+# для всех воркеров (core.sqlite_cache). Каталог закрыт для других
+# пользователей: значения кеша читаются через pickle.
+CACHE_DIR = os.environ.get(
+    'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+)
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.sqlite_cache.SQLiteCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 50000,
+                'MAX_SIZE': 256 * 2 ** 20,
+            },
+        }
     }
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'core.slow_queries.PrivateRotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 2 ** 20,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
@@ -17,10 +17,13 @@ from django.contrib import admin
 # импорт include позволит использовать адреса, включенные в приложения
 from django.urls import include, path
 
+from core.views import timings
+
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include(('posts.urls', 'posts'), namespace='posts')),
+    path('admin/timings/', timings, name='timings'),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
 ]